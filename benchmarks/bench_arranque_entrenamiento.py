@@ -0,0 +1,56 @@
+"""
+Mide el tiempo de arranque del ChatBot en varios reinicios seguidos con el
+entrenamiento anterior (ListTrainer en cada arranque) y con el entrenamiento
+versionado (train_if_changed), sobre una base SQLite temporal.
+
+Además del tiempo de cada arranque muestra cuántas frases quedan en la base,
+para ver los duplicados que acumulaba el entrenamiento en cada reinicio.
+
+Uso: python benchmarks/bench_arranque_entrenamiento.py [reinicios]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from chatterbot import ChatBot
+from chatterbot.trainers import ListTrainer
+from bot.training import load_corpus, train_if_changed
+
+def crear_chatbot(ruta):
+    return ChatBot(
+        'Biblot',
+        storage_adapter='chatterbot.storage.SQLStorageAdapter',
+        database_uri=f'sqlite:///{ruta}',
+        preprocessors=[
+            'chatterbot.preprocessors.clean_whitespace',
+            'chatterbot.preprocessors.convert_to_ascii',
+            'chatterbot.preprocessors.unescape_html'
+        ]
+    )
+
+def entrenamiento_anterior(chatbot):
+    trainer = ListTrainer(chatbot)
+    _, conversaciones, _ = load_corpus()
+    for conversacion in conversaciones:
+        trainer.train(conversacion)
+
+def medir(nombre, entrenar, reinicios):
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'chat.sqlite3')
+        print(nombre)
+        for reinicio in range(1, reinicios + 1):
+            inicio = time.perf_counter()
+            chatbot = crear_chatbot(ruta)
+            entrenar(chatbot)
+            duracion = time.perf_counter() - inicio
+            print(f"  arranque {reinicio}: {duracion * 1000:8.1f} ms, {chatbot.storage.count()} frases en la base")
+            chatbot.storage.engine.dispose()
+
+if __name__ == "__main__":
+    reinicios = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    medir("Antes: ListTrainer en cada arranque", entrenamiento_anterior, reinicios)
+    medir("Después: entrenamiento versionado", train_if_changed, reinicios)
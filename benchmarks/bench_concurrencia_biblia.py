@@ -0,0 +1,88 @@
+"""
+Benchmark de concurrencia de BibleHelper contra un servidor de pasajes falso local.
+
+Lanza N consultas en paralelo (como N usuarios usando !versiculo a la vez) y
+compara el tiempo total con el de hacerlas una tras otra. Si las consultas se
+solapan, el tiempo en paralelo es cercano a la latencia de una sola petición.
+
+Cada consulta pide un versículo distinto y el helper usa un almacén vacío y
+una caché temporal, así ninguna se sirve de la caché ni se agrupa con otra
+(las agrupadas aparecen aparte en las estadísticas) y no se toca la caché
+real del bot.
+
+Uso: python benchmarks/bench_concurrencia_biblia.py [N] [latencia_ms]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from bible.bible_helper import BibleHelper
+from bible.http_client import HttpClient
+from bible.passage_cache import DiskCache, PassageCache
+from bible.passage_store import PassageStore
+from bible.references import parse_reference
+
+PAGINA = """<html><body>
+<div class="passage-text"><p><span class="text {osis}-{capitulo}-{versiculo}"><sup class="versenum">{versiculo} </sup>
+Texto de prueba del versículo {versiculo}.</span></p></div>
+</body></html>"""
+
+async def iniciar_servidor(latencia):
+    async def pasaje(request):
+        await asyncio.sleep(latencia)
+        reference = parse_reference(request.query['search'])
+        pagina = PAGINA.format(osis=reference.book.osis, capitulo=reference.chapter, versiculo=reference.start)
+        return web.Response(text=pagina, content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/passage/', pasaje)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    puerto = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{puerto}/passage/?search="
+
+async def main(n, latencia):
+    runner, url = await iniciar_servidor(latencia)
+    directorio = tempfile.TemporaryDirectory()
+    helper = BibleHelper(
+        http_client=HttpClient(max_concurrency=n),
+        store=PassageStore(os.path.join(directorio.name, 'sin_almacen.db')),
+        cache=PassageCache(disk=DiskCache(os.path.join(directorio.name, 'cache.db')))
+    )
+    helper.bible_api_url = url
+    try:
+        # Versículos distintos en cada fase (Salmos 119 tiene 176)
+        inicio = time.perf_counter()
+        for versiculo in range(1, n + 1):
+            await helper.get_verse(f"Salmos 119:{versiculo}")
+        secuencial = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(helper.get_verse(f"Salmos 119:{versiculo}") for versiculo in range(n + 1, 2 * n + 1)))
+        paralelo = time.perf_counter() - inicio
+
+        stats = helper.stats()
+        print(f"{n} consultas, latencia del servidor {latencia * 1000:.0f} ms")
+        print(f"  secuencial: {secuencial:.3f} s")
+        print(f"  paralelo:   {paralelo:.3f} s")
+        print(f"  aceleración: {secuencial / paralelo:.1f}x")
+        print(f"  peticiones: {stats['upstream']['calls']}, agrupadas: {stats['coalesced']}, "
+              f"aciertos de caché: {stats['cache']['memory_hits'] + stats['cache']['disk_hits']}")
+    finally:
+        await helper.close()
+        await runner.cleanup()
+        directorio.cleanup()
+
+if __name__ == "__main__":
+    n = min(int(sys.argv[1]) if len(sys.argv) > 1 else 20, 88)
+    latencia = int(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.2
+    asyncio.run(main(n, latencia))
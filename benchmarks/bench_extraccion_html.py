@@ -0,0 +1,56 @@
+"""
+Micro-benchmark de extracción de pasajes sobre páginas guardadas de biblegateway.
+
+Compara la ruta anterior (BeautifulSoup con html.parser, get_text() del div
+completo y cinco re.sub) con extract_passages, que recorre una sola vez el
+subárbol del pasaje. Mide tiempo por página y memoria máxima con tracemalloc.
+
+Uso: python benchmarks/bench_extraccion_html.py [repeticiones]
+"""
+
+import glob
+import os
+import re
+import sys
+import timeit
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from bible.html_extractor import extract_passages
+
+PAGINAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'paginas', '*.html')
+
+def ruta_anterior(html):
+    """Copia de la limpieza que hacía BibleHelper antes de extract_passages"""
+    soup = BeautifulSoup(html, 'html.parser')
+    verse_text = soup.find('div', class_='passage-text')
+    verse_text = verse_text.get_text().strip()
+    verse_text = re.sub(r'Read full chapter.*$', '', verse_text, flags=re.IGNORECASE | re.MULTILINE)
+    verse_text = re.sub(r'Cross references.*$', '', verse_text, flags=re.IGNORECASE | re.MULTILINE)
+    verse_text = re.sub(r'Mateo \d+:\d+ in all Spanish translations.*$', '', verse_text, flags=re.IGNORECASE | re.MULTILINE)
+    verse_text = re.sub(r'^\d+\s*', '', verse_text)
+    verse_text = re.sub(r'\([A-Z]\)', '', verse_text)
+    return verse_text.strip()
+
+def memoria_maxima(funcion, html):
+    tracemalloc.start()
+    funcion(html)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return pico
+
+def main(repeticiones):
+    for ruta in sorted(glob.glob(PAGINAS)):
+        with open(ruta, encoding='utf-8') as f:
+            html = f.read()
+        print(f"{os.path.basename(ruta)} ({len(html) / 1024:.1f} KiB)")
+        for nombre, funcion in (('anterior', ruta_anterior), ('extract_passages', extract_passages)):
+            segundos = timeit.timeit(lambda: funcion(html), number=repeticiones) / repeticiones
+            pico = memoria_maxima(funcion, html)
+            print(f"  {nombre:<17} {segundos * 1e6:9.1f} µs/página   pico {pico / 1024:8.1f} KiB")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
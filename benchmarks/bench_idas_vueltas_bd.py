@@ -0,0 +1,168 @@
+"""
+Cuenta las idas y vueltas al servidor de un `!nota` antes y después de
+quitar la comprobación `SELECT 1` previa a cada operación.
+
+Usa SQLite como sustituto de Postgres envuelto en una conexión que imita a
+psycopg2: fuera de autocommit, la primera sentencia de cada transacción va
+precedida de un BEGIN que se envía aparte, y commit()/rollback() son otra
+ida y vuelta. Cada ida y vuelta espera `latencia_ms`.
+
+Flujo anterior, por operación del pool (get_or_create_user y add_note):
+ping (SELECT 1 + rollback), las sentencias de la operación en una sola
+transacción y un commit. Flujo actual: autocommit, sin ping, solo las
+sentencias; el usuario se registra con el mismo upsert de una sentencia que
+Database.get_or_create_user. Un `!nota` son dos operaciones; en el flujo
+anterior los usuarios nuevos añaden un INSERT. Se mide el número de idas y vueltas, no el rendimiento: con SQLite
+los bloqueos de escritura dominan y no se parecen a los de Postgres.
+También se rompen conexiones a propósito para comprobar que el reintento
+funciona. Cualquier error que no sea una de esas roturas provocadas hace
+fallar el script.
+
+Uso: python benchmarks/bench_idas_vueltas_bd.py [operaciones] [latencia_ms]
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from database.pool import ConnectionPool
+
+USUARIOS = 20
+
+class ConexionRota(Exception):
+    pass
+
+class ConexionContada:
+    """Conexión SQLite que cuenta las idas y vueltas como las haría psycopg2"""
+    sentencias = 0
+    begins = 0
+    lock = threading.Lock()
+
+    def __init__(self, ruta, latencia, autocommit):
+        self.conn = sqlite3.connect(ruta, timeout=30, check_same_thread=False, isolation_level=None)
+        self.latencia = latencia
+        self.autocommit = autocommit
+        self.en_transaccion = False
+        self.rota = False
+        self.closed = 0
+
+    def _ida_y_vuelta(self, sql, params=(), begin=False):
+        with self.lock:
+            ConexionContada.sentencias += 1
+            ConexionContada.begins += begin
+        time.sleep(self.latencia)
+        if self.rota:
+            self.closed = 2
+            raise ConexionRota("la conexión se cerró del lado del servidor")
+        return self.conn.execute(sql, params)
+
+    def execute(self, sql, params=()):
+        if not self.autocommit and not self.en_transaccion:
+            # IMMEDIATE evita los interbloqueos de SQLite al pasar de lectura a escritura,
+            # que en Postgres no existen; cuenta igual como una ida y vuelta
+            self._ida_y_vuelta('BEGIN IMMEDIATE', begin=True)
+            self.en_transaccion = True
+        return self._ida_y_vuelta(sql, params)
+
+    def commit(self):
+        self._ida_y_vuelta('COMMIT')
+        self.en_transaccion = False
+
+    def rollback(self):
+        self._ida_y_vuelta('ROLLBACK')
+        self.en_transaccion = False
+
+    def close(self):
+        self.conn.close()
+
+def ping(conn):
+    conn.execute('SELECT 1')
+    conn.rollback()
+
+def usuario_antes(conn, user_id, username):
+    ping(conn)
+    if conn.execute('SELECT id FROM users WHERE id = ?', (user_id,)).fetchone() is None:
+        conn.execute('INSERT INTO users (id, username) VALUES (?, ?)', (user_id, username))
+    conn.commit()
+
+def nota_antes(conn, user_id, texto):
+    ping(conn)
+    conn.execute('INSERT INTO notes (user_id, note) VALUES (?, ?)', (user_id, texto))
+    conn.commit()
+
+def usuario_ahora(conn, user_id, username):
+    # IS NOT es el IS DISTINCT FROM de SQLite
+    conn.execute('''
+        INSERT INTO users (id, username) VALUES (?, ?)
+        ON CONFLICT (id) DO UPDATE SET username = excluded.username
+        WHERE users.username IS NOT excluded.username
+    ''', (user_id, username))
+
+def nota_ahora(conn, user_id, texto):
+    conn.execute('INSERT INTO notes (user_id, note) VALUES (?, ?)', (user_id, texto))
+
+async def medir(nombre, ruta, usuario, nota, autocommit, operaciones, latencia, romper=False):
+    with sqlite3.connect(ruta) as conn:
+        conn.execute('DELETE FROM users')
+        conn.execute('DELETE FROM notes')
+    pool = ConnectionPool(
+        lambda: ConexionContada(ruta, latencia, autocommit),
+        min_size=4,
+        max_size=4,
+        acquire_timeout=60,
+        discard_on=(ConexionRota,),
+        is_lost=lambda conexion: conexion.closed != 0
+    )
+    await pool.open()
+    if romper:
+        for conexion, _ in pool._idle:
+            conexion.rota = True
+
+    async def comando(i):
+        user_id = f"usuario{i % USUARIOS}"
+        await pool.run(usuario, user_id, f"nombre{i % USUARIOS}")
+        # La nota no se reintenta, como en Database.add_note
+        await pool.run(nota, user_id, f"nota {i}", retry=False)
+
+    ConexionContada.sentencias = ConexionContada.begins = 0
+    resultados = await asyncio.gather(*(comando(i) for i in range(operaciones)), return_exceptions=True)
+    fallidos = 0
+    for resultado in resultados:
+        if isinstance(resultado, ConexionRota):
+            fallidos += 1
+        elif isinstance(resultado, BaseException):
+            await pool.close()
+            raise resultado
+    stats = pool.stats()
+    await pool.close()
+    idas = ConexionContada.sentencias / operaciones
+    begins = ConexionContada.begins / operaciones
+    print(f"  {nombre:<24} {idas:5.2f} idas y vueltas por !nota ({idas - begins:.2f} sin contar los BEGIN "
+          f"implícitos), {idas * latencia * 1000:5.1f} ms de red por !nota, "
+          f"reintentos {stats['retries']}, fallidos {fallidos}")
+
+async def main(operaciones, latencia):
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'notas.db')
+        conn = sqlite3.connect(ruta)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE users (id TEXT PRIMARY KEY, username TEXT NOT NULL)')
+        conn.execute('CREATE TABLE notes (id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, note TEXT NOT NULL)')
+        conn.close()
+
+        print(f"{operaciones} comandos !nota de {USUARIOS} usuarios, latencia simulada {latencia * 1000:.0f} ms")
+        await medir("antes (ping + commit)", ruta, usuario_antes, nota_antes, False, operaciones, latencia)
+        await medir("ahora (autocommit)", ruta, usuario_ahora, nota_ahora, True, operaciones, latencia)
+        await medir("ahora, conexiones rotas", ruta, usuario_ahora, nota_ahora, True, operaciones, latencia,
+                    romper=True)
+
+if __name__ == "__main__":
+    operaciones = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    latencia = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.002
+    asyncio.run(main(operaciones, latencia))
@@ -0,0 +1,96 @@
+"""
+Comprueba contra un servidor de completions falso local que el bot sigue
+atendiendo mientras hay completions pendientes.
+
+Lanza varias explicaciones a la vez (cada una tarda `latencia` segundos en el
+servidor falso) y, en paralelo, un "comando" ligero que se ejecuta cada 50 ms.
+Si el event loop no se bloquea, el retraso máximo de ese comando se mantiene
+en milisegundos. También muestra las métricas de espera en la cola. Las
+respuestas se guardan en una caché temporal, no en la del bot.
+
+Uso: python benchmarks/bench_openai_concurrencia.py [completions] [max_en_vuelo] [latencia_s]
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+from openai import AsyncOpenAI
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from ai.openai_helper import OpenAIHelper
+from ai.response_cache import ResponseCache
+
+async def iniciar_servidor(latencia):
+    async def completions(request):
+        cuerpo = await request.json()
+        await asyncio.sleep(latencia)
+        return web.json_response({
+            "id": "chatcmpl-falso",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": cuerpo["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": "Explicación de prueba."}
+            }],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 3, "total_tokens": 13}
+        })
+
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    puerto = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{puerto}/v1"
+
+async def comando_ligero(detener, retrasos):
+    """Simula otros comandos del bot: debería ejecutarse cada 50 ms"""
+    while not detener.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(0.05)
+        retrasos.append(time.perf_counter() - inicio - 0.05)
+
+async def main(total, max_en_vuelo, latencia):
+    runner, url = await iniciar_servidor(latencia)
+    cliente = AsyncOpenAI(base_url=url, api_key="falsa")
+    directorio = tempfile.TemporaryDirectory()
+    helper = OpenAIHelper(
+        client=cliente,
+        max_in_flight=max_en_vuelo,
+        response_cache=ResponseCache(os.path.join(directorio.name, 'respuestas.db'))
+    )
+    detener = asyncio.Event()
+    retrasos = []
+    try:
+        tarea = asyncio.create_task(comando_ligero(detener, retrasos))
+        inicio = time.perf_counter()
+        await asyncio.gather(*(helper.get_verse_explanation(f"Versículo {i}") for i in range(total)))
+        duracion = time.perf_counter() - inicio
+        detener.set()
+        await tarea
+
+        stats = helper.stats()
+        print(f"{total} completions, máximo {max_en_vuelo} en vuelo, latencia {latencia:.1f} s")
+        print(f"  tiempo total:              {duracion:.2f} s")
+        print(f"  comandos atendidos:        {len(retrasos)}")
+        print(f"  retraso máximo del loop:   {max(retrasos) * 1000:.1f} ms")
+        print(f"  espera media en la cola:   {stats['queue_wait_avg']:.2f} s")
+        print(f"  espera máxima en la cola:  {stats['queue_wait_max']:.2f} s")
+    finally:
+        await helper.close()
+        await runner.cleanup()
+        directorio.cleanup()
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    max_en_vuelo = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    latencia = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+    asyncio.run(main(total, max_en_vuelo, latencia))
@@ -0,0 +1,66 @@
+"""
+Prueba de carga del pool de conexiones (database/pool.py) con SQLite como
+sustituto local de Postgres.
+
+Lanza muchas operaciones concurrentes tipo `!nota` (insertar una nota y leer
+las del usuario) con distintos tamaños de pool. Como SQLite no tiene red,
+cada operación simula la latencia de ida y vuelta al servidor con una espera
+de `latencia_ms` dentro del hilo, igual que haría psycopg2 esperando a
+Postgres. El rendimiento debería crecer con el tamaño del pool.
+
+Uso: python benchmarks/bench_pool_bd.py [operaciones] [latencia_ms]
+"""
+
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from database.pool import ConnectionPool
+
+def operacion(latencia):
+    def ejecutar(conn, user_id, nota):
+        time.sleep(latencia)  # ida y vuelta simulada al servidor
+        conn.execute('INSERT INTO notes (user_id, note) VALUES (?, ?)', (user_id, nota))
+        conn.commit()
+        time.sleep(latencia)
+        return conn.execute('SELECT note FROM notes WHERE user_id = ? ORDER BY id DESC LIMIT 10', (user_id,)).fetchall()
+    return ejecutar
+
+async def medir(ruta, tamano, operaciones, latencia):
+    pool = ConnectionPool(
+        lambda: sqlite3.connect(ruta, timeout=30, check_same_thread=False),
+        min_size=1,
+        max_size=tamano,
+        acquire_timeout=60
+    )
+    await pool.open()
+    ejecutar = operacion(latencia)
+    inicio = time.perf_counter()
+    await asyncio.gather(*(pool.run(ejecutar, f"usuario{i % 50}", f"nota {i}") for i in range(operaciones)))
+    duracion = time.perf_counter() - inicio
+    stats = pool.stats()
+    await pool.close()
+    print(f"  pool de {tamano:>2}: {operaciones / duracion:8.1f} op/s, "
+          f"espera media por conexión {stats['wait_avg'] * 1000:7.1f} ms, {stats['size']} conexiones abiertas")
+
+async def main(operaciones, latencia):
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'notas.db')
+        conn = sqlite3.connect(ruta)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE notes (id INTEGER PRIMARY KEY, user_id TEXT NOT NULL, note TEXT NOT NULL)')
+        conn.close()
+
+        print(f"{operaciones} operaciones concurrentes, latencia simulada {latencia * 1000:.0f} ms")
+        for tamano in (1, 2, 4, 8, 16):
+            await medir(ruta, tamano, operaciones, latencia)
+
+if __name__ == "__main__":
+    operaciones = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    latencia = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.005
+    asyncio.run(main(operaciones, latencia))
@@ -0,0 +1,77 @@
+"""
+Compara la búsqueda de la frase más parecida con el índice de n-gramas
+(NgramIndex) frente al recorrido frase por frase con SequenceMatcher, que es
+lo que hace la comparación Levenshtein de ChatterBot en BestMatch.
+
+Genera corpus sintéticos de 1.000, 10.000 y 100.000 frases y mide el tiempo
+de construcción del índice, la latencia por consulta (mediana y p95) y el
+tiempo de añadir 100 frases nuevas a un índice ya construido.
+
+Uso: python benchmarks/bench_similitud_chat.py [consultas] [consultas_base]
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+from difflib import SequenceMatcher
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from ai.ngram_index import NgramIndex
+
+PALABRAS = (
+    'qué cómo dónde cuándo por fe oración biblia dios jesús amor esperanza perdón gracia '
+    'salvación iglesia pecado espíritu santo padre hijo vida eterna leer estudiar orar '
+    'significa puedo debo empiezo libro capítulo versículo salmos evangelio juan mateo '
+    'profeta ley promesa reino cielo paz gozo paciencia bondad fidelidad humildad'
+).split()
+
+def frase(generador):
+    return ' '.join(generador.choice(PALABRAS) for _ in range(generador.randint(3, 9))) + '?'
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p))]
+
+def medir(tamano, consultas, consultas_base):
+    generador = random.Random(tamano)
+    frases = [frase(generador) for _ in range(tamano)]
+    preguntas = [frase(generador) for _ in range(consultas)]
+
+    indice = NgramIndex()
+    inicio = time.perf_counter()
+    indice.add((texto, i) for i, texto in enumerate(frases))
+    construccion = time.perf_counter() - inicio
+    distintas = len(indice)
+
+    tiempos = []
+    for pregunta in preguntas:
+        inicio = time.perf_counter()
+        indice.search(pregunta, k=5)
+        tiempos.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    indice.add((frase(generador), None) for _ in range(100))
+    indice.search(preguntas[0])
+    incremental = time.perf_counter() - inicio
+
+    base = []
+    for pregunta in preguntas[:consultas_base]:
+        inicio = time.perf_counter()
+        max(frases, key=lambda texto: SequenceMatcher(None, pregunta, texto).ratio())
+        base.append(time.perf_counter() - inicio)
+
+    print(f"{tamano:>7} frases ({distintas} distintas)")
+    print(f"  construcción del índice:      {construccion * 1000:9.1f} ms")
+    print(f"  consulta n-gramas (mediana):  {statistics.median(tiempos) * 1000:9.2f} ms")
+    print(f"  consulta n-gramas (p95):      {percentil(tiempos, 0.95) * 1000:9.2f} ms")
+    print(f"  añadir 100 frases:            {incremental * 1000:9.1f} ms")
+    print(f"  recorrido SequenceMatcher:    {statistics.median(base) * 1000:9.2f} ms (mediana de {len(base)})")
+
+if __name__ == "__main__":
+    consultas = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    consultas_base = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    for tamano in (1_000, 10_000, 100_000):
+        medir(tamano, consultas, consultas_base)
@@ -0,0 +1,30 @@
+def estimate_tokens(text):
+    """Estimación aproximada de tokens (unos 4 caracteres por token)"""
+    return (len(text) + 3) // 4
+
+def split_verses(chapter_text, max_tokens):
+    """
+    Divide el texto de un capítulo (un versículo por línea) en bloques de
+    como mucho `max_tokens` tokens estimados, sin partir ningún versículo.
+    """
+    chunks = []
+    current = []
+    size = 0
+    for line in chapter_text.splitlines():
+        if not line.strip():
+            continue
+        tokens = estimate_tokens(line) + 1
+        if current and size + tokens > max_tokens:
+            chunks.append('\n'.join(current))
+            current = []
+            size = 0
+        current.append(line)
+        size += tokens
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+def verse_span(chunk):
+    """Rango de versículos de un bloque, p. ej. '1-24'"""
+    lines = chunk.splitlines()
+    return f"{lines[0].split(' ', 1)[0]}-{lines[-1].split(' ', 1)[0]}"
@@ -0,0 +1,166 @@
+import math
+import re
+from collections import Counter
+import numpy as np
+from bible.references import fold
+
+_NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+
+def normalize(text):
+    """Minúsculas, sin acentos ni signos de puntuación"""
+    return _NON_WORD_RE.sub(' ', fold(text)).strip()
+
+class NgramIndex:
+    """
+    Índice TF-IDF de n-gramas de caracteres en arrays de NumPy.
+
+    La matriz principal se guarda ordenada por columna (n-grama), así que la
+    similitud con todas las frases es un producto matriz-vector disperso que
+    solo recorre los n-gramas de la consulta. Las frases nuevas van a un
+    tramo pequeño que se recorre entero y se fusiona con la matriz principal
+    cuando crece (`merge_ratio`), sin recalcular nada en cada entrenamiento.
+    """
+    def __init__(self, n=3, merge_ratio=0.1, min_merge=5000):
+        self.n = n
+        self.merge_ratio = merge_ratio
+        self.min_merge = min_merge
+        self.vocabulary = {}
+        self.keys = []
+        self.payloads = []
+        self._positions = {}
+        # Todas las entradas (fila, columna, tf) para poder reconstruir
+        self._rows = np.empty(0, dtype=np.int32)
+        self._cols = np.empty(0, dtype=np.int32)
+        self._tf = np.empty(0, dtype=np.float32)
+        self._df = np.empty(0, dtype=np.float32)
+        self._idf = np.empty(0, dtype=np.float32)
+        self._norms = np.empty(0, dtype=np.float32)
+        # Matriz principal ordenada por columna
+        self._col_ptr = np.zeros(1, dtype=np.int64)
+        self._main_rows = np.empty(0, dtype=np.int32)
+        self._main_weights = np.empty(0, dtype=np.float32)
+        self._merged = 0
+        # Entradas añadidas después de la última fusión
+        self._delta_rows = np.empty(0, dtype=np.int32)
+        self._delta_cols = np.empty(0, dtype=np.int32)
+        self._delta_weights = np.empty(0, dtype=np.float32)
+        self.merges = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _ngrams(self, text):
+        padded = f" {normalize(text)} "
+        return Counter(padded[i:i + self.n] for i in range(max(len(padded) - self.n + 1, 1)))
+
+    def add(self, items):
+        """Añade pares (texto, dato asociado); los textos ya indexados se ignoran"""
+        rows, cols, tfs = [], [], []
+        added = 0
+        for text, payload in items:
+            key = normalize(text)
+            if not key or key in self._positions:
+                continue
+            row = len(self.keys)
+            self._positions[key] = row
+            self.keys.append(text)
+            self.payloads.append(payload)
+            added += 1
+            for gram, count in self._ngrams(text).items():
+                rows.append(row)
+                cols.append(self.vocabulary.setdefault(gram, len(self.vocabulary)))
+                tfs.append(1 + math.log(count))
+        if not added:
+            return 0
+
+        rows = np.array(rows, dtype=np.int32)
+        cols = np.array(cols, dtype=np.int32)
+        tfs = np.array(tfs, dtype=np.float32)
+        self._rows = np.concatenate([self._rows, rows])
+        self._cols = np.concatenate([self._cols, cols])
+        self._tf = np.concatenate([self._tf, tfs])
+        df = np.zeros(len(self.vocabulary), dtype=np.float32)
+        df[:len(self._df)] = self._df
+        self._df = df + np.bincount(cols, minlength=len(self.vocabulary))
+
+        if len(self._delta_rows) + len(rows) > max(self.min_merge, self.merge_ratio * len(self._main_rows)):
+            self._merge()
+            return added
+
+        # Los n-gramas nuevos toman su idf actual; los demás conservan el de la última fusión
+        idf = np.empty(len(self.vocabulary), dtype=np.float32)
+        idf[:len(self._idf)] = self._idf
+        idf[len(self._idf):] = self._compute_idf(self._df[len(self._idf):])
+        self._idf = idf
+        weights = tfs * self._idf[cols]
+        norms = np.sqrt(np.bincount(rows - rows[0], weights=weights ** 2))
+        self._norms = np.concatenate([self._norms, np.maximum(norms, 1e-6).astype(np.float32)])
+        self._delta_rows = np.concatenate([self._delta_rows, rows])
+        self._delta_cols = np.concatenate([self._delta_cols, cols])
+        self._delta_weights = np.concatenate([self._delta_weights, weights])
+        return added
+
+    def _compute_idf(self, df):
+        return (np.log((1 + len(self.keys)) / (1 + df)) + 1).astype(np.float32)
+
+    def _merge(self):
+        """Recalcula pesos y normas con las frecuencias actuales y ordena por columna"""
+        self._idf = self._compute_idf(self._df)
+        weights = self._tf * self._idf[self._cols]
+        norms = np.sqrt(np.bincount(self._rows, weights=weights ** 2, minlength=len(self.keys)))
+        self._norms = np.maximum(norms, 1e-6).astype(np.float32)
+        order = np.argsort(self._cols, kind='stable')
+        self._main_rows = self._rows[order]
+        self._main_weights = weights[order]
+        self._col_ptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self._cols, minlength=len(self.vocabulary)), out=self._col_ptr[1:])
+        self._merged = len(self.vocabulary)
+        self._delta_rows = np.empty(0, dtype=np.int32)
+        self._delta_cols = np.empty(0, dtype=np.int32)
+        self._delta_weights = np.empty(0, dtype=np.float32)
+        self.merges += 1
+
+    def search(self, text, k=5):
+        """Las `k` frases más parecidas: [(texto, dato asociado, similitud coseno)]"""
+        if not self.keys:
+            return []
+        columns = []
+        values = []
+        for gram, count in self._ngrams(text).items():
+            column = self.vocabulary.get(gram)
+            if column is not None:
+                columns.append(column)
+                values.append((1 + math.log(count)) * self._idf[column])
+        if not columns:
+            return []
+        values = np.array(values, dtype=np.float32)
+        query_norm = np.linalg.norm(values)
+
+        scores = np.zeros(len(self.keys), dtype=np.float32)
+        # Matriz principal: solo las columnas de los n-gramas de la consulta
+        main = [(column, value) for column, value in zip(columns, values) if column < self._merged]
+        if main:
+            starts = self._col_ptr[[column for column, _ in main]]
+            ends = self._col_ptr[[column + 1 for column, _ in main]]
+            lengths = ends - starts
+            positions = np.repeat(ends - lengths.cumsum(), lengths) + np.arange(lengths.sum())
+            scores += np.bincount(
+                self._main_rows[positions],
+                weights=self._main_weights[positions] * np.repeat([value for _, value in main], lengths),
+                minlength=len(self.keys)
+            ).astype(np.float32)
+        # Tramo reciente: producto sobre todas sus entradas
+        if len(self._delta_rows):
+            query = np.zeros(len(self.vocabulary), dtype=np.float32)
+            query[columns] = values
+            scores += np.bincount(
+                self._delta_rows,
+                weights=self._delta_weights * query[self._delta_cols],
+                minlength=len(self.keys)
+            ).astype(np.float32)
+
+        scores /= self._norms * query_norm
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.keys[i], self.payloads[i], float(scores[i])) for i in top if scores[i] > 0]
@@ -0,0 +1,71 @@
+import threading
+from chatterbot import filters
+from chatterbot.logic import LogicAdapter
+from ai.ngram_index import NgramIndex
+
+class NgramMatch(LogicAdapter):
+    """
+    Sustituto de BestMatch: busca la pregunta entrenada más parecida con el
+    índice de n-gramas en lugar de comparar con Levenshtein frase por frase.
+    Las frases que se entrenan o aprenden se incorporan al índice en la
+    siguiente consulta. Con varios hilos de chat (CHAT_WORKERS) el índice se
+    actualiza y consulta bajo un lock, porque sus listas y arrays se modifican.
+    Recuerda por hilo la última respuesta que dio (`last_response`), porque
+    ChatterBot no dice qué adaptador eligió.
+    """
+    def __init__(self, chatbot, **kwargs):
+        super().__init__(chatbot, **kwargs)
+        self.minimum_similarity = kwargs.get('minimum_similarity', 0.3)
+        self.top_k = kwargs.get('top_k', 5)
+        self.index = NgramIndex(kwargs.get('ngram_size', 3))
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _sync(self):
+        """Indexa las frases guardadas desde la última consulta (una consulta por clave primaria)"""
+        storage = self.chatbot.storage
+        Statement = storage.get_model('statement')
+        session = storage.Session()
+        try:
+            rows = session.query(
+                Statement.id, Statement.in_response_to, Statement.search_in_response_to
+            ).filter(Statement.id > self._last_id).order_by(Statement.id).all()
+        finally:
+            session.close()
+        if rows:
+            self._last_id = rows[-1][0]
+            self.index.add((row[1], row[2]) for row in rows if row[1])
+
+    def process(self, input_statement, additional_response_selection_parameters=None):
+        with self._lock:
+            self._sync()
+            matches = self.index.search(input_statement.text, self.top_k)
+        recent_repeated_responses = filters.get_recent_repeated_responses(
+            self.chatbot, input_statement.conversation
+        )
+        for text, search_in_response_to, similarity in matches:
+            if similarity < self.minimum_similarity:
+                break
+            parameters = {
+                'search_in_response_to': search_in_response_to,
+                'exclude_text': recent_repeated_responses,
+            }
+            if additional_response_selection_parameters:
+                parameters.update(additional_response_selection_parameters)
+            response_list = list(self.chatbot.storage.filter(**parameters))
+            if response_list:
+                self.chatbot.logger.info(f'Coincidencia "{text}" con similitud {similarity:.2f}')
+                response = self.select_response(input_statement, response_list, self.chatbot.storage)
+                response.confidence = similarity
+                self._local.response = response.text
+                return response
+
+        response = self.get_default_response(input_statement)
+        response.confidence = 0
+        self._local.response = response.text
+        return response
+
+    def last_response(self):
+        """Texto de la última respuesta de este adaptador en el hilo actual"""
+        return getattr(self._local, 'response', None)
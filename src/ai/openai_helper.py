@@ -1,17 +1,143 @@
+import asyncio
+import functools
 import os
-from openai import OpenAI
+import time
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
+from ai.chunking import split_verses, verse_span
+from ai.response_cache import ResponseCache, response_key
+from utils.resilience import Resilience
+from utils.singleflight import SingleFlight
 
 load_dotenv()
 
 class OpenAIHelper:
-    def __init__(self):
-        self.client = OpenAI()
-        
-    def get_verse_explanation(self, verse_text):
+    def __init__(self, client=None, max_in_flight=None, timeout=None, response_cache=None,
+                 chunk_tokens=None, resilience=None):
+        # Máximo de completions simultáneas y tiempo límite por llamada (segundos)
+        self.max_in_flight = max_in_flight or int(os.getenv('OPENAI_MAX_IN_FLIGHT', '4'))
+        self.timeout = timeout or float(os.getenv('OPENAI_TIMEOUT', '30'))
+        # Cliente asíncrono: las completions no bloquean el event loop del bot
+        # Los reintentos los hace la capa de resiliencia, no el cliente
+        self.client = client or AsyncOpenAI(timeout=self.timeout, max_retries=0)
+        # Reintentos, circuito y, si se configura OPENAI_HEDGE_AFTER, petición duplicada
+        hedge_after = os.getenv('OPENAI_HEDGE_AFTER')
+        self.resilience = resilience or Resilience(
+            'openai', timeout=self.timeout, retries=1, hedge_after=float(hedge_after) if hedge_after else None
+        )
+        # Peticiones idénticas en curso comparten una sola completion
+        self.singleflight = SingleFlight()
+        # Respuestas ya generadas para el mismo prompt (persisten entre reinicios)
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        # Presupuesto de tokens por bloque al resumir capítulos largos
+        self.chunk_tokens = chunk_tokens or int(os.getenv('OPENAI_CHUNK_TOKENS', '1500'))
+        self._semaphore = None
+        self.completions = 0
+        self.waiting = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    async def _complete(self, task, timeout=None, variants=None, **params):
+        """
+        Pide una completion. Primero busca en la caché de respuestas; las
+        peticiones idénticas simultáneas comparten una sola llamada al modelo.
+        """
+        key = response_key(task, params)
+        cached = self.response_cache.get(key, variants)
+        if cached is not None:
+            return cached
+
+        try:
+            content = await self.singleflight.do(key, self._create, params, timeout or self.timeout)
+        except Exception:
+            # Con el servicio caído, mejor una respuesta antigua que ninguna
+            stale = self.response_cache.get_stale(key)
+            if stale is None:
+                raise
+            return stale
+        self.response_cache.add(key, content)
+        return content
+
+    async def _stream(self, task, timeout=None, **params):
+        """Igual que _complete, pero va entregando el texto a medida que llega"""
+        key = response_key(task, params)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+        parts = []
+        timeout = timeout or self.timeout
+        await self._acquire()
+        try:
+            try:
+                stream = await self.resilience.call(
+                    functools.partial(self.client.chat.completions.create, stream=True, timeout=timeout, **params),
+                    timeout=timeout
+                )
+            except Exception:
+                stale = self.response_cache.get_stale(key)
+                if stale is None:
+                    raise
+                yield stale
+                return
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        finally:
+            self._semaphore.release()
+        self.response_cache.add(key, ''.join(parts))
+
+    async def _acquire(self):
+        """Espera un hueco entre las completions en vuelo y registra la espera"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        waited = time.perf_counter() - queued_at
+        self.queue_wait_total += waited
+        self.queue_wait_max = max(self.queue_wait_max, waited)
+        self.completions += 1
+
+    async def _create(self, params, timeout):
+        await self._acquire()
+        try:
+            response = await self.resilience.call(
+                functools.partial(self.client.chat.completions.create, timeout=timeout, **params),
+                timeout=timeout
+            )
+        finally:
+            self._semaphore.release()
+        return response.choices[0].message.content
+
+    def stats(self):
+        """Métricas de la cola de completions"""
+        return {
+            'completions': self.completions,
+            'waiting': self.waiting,
+            'max_in_flight': self.max_in_flight,
+            'queue_wait_avg': self.queue_wait_total / self.completions if self.completions else 0.0,
+            'queue_wait_max': self.queue_wait_max,
+            'coalesced': self.singleflight.saved,
+            'cache': self.response_cache.stats(),
+            'upstream': self.resilience.stats(),
+        }
+
+    async def close(self):
+        await self.client.close()
+        self.response_cache.close()
+
+    async def get_verse_explanation(self, verse_text):
         """Obtiene una explicación del versículo usando OpenAI"""
         try:
-            response = self.client.chat.completions.create(
+            return await self._complete(
+                'verse_explanation',
                 model="gpt-4o-mini",
                 messages=[
                     {"role": "system", "content": "Eres un experto en la Biblia que explica versículos de manera clara y concisa."},
@@ -19,44 +145,96 @@ class OpenAIHelper:
                 ],
                 max_tokens=150
             )
-            return response.choices[0].message.content
         except Exception as e:
             print(f"Error al obtener explicación: {str(e)}")
             return "Lo siento, no pude generar una explicación en este momento."
             
-    def generate_daily_reflection(self, verse_text):
+    async def _daily_reflection(self, verse_text):
+        return await self._complete(
+            'daily_reflection',
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "Eres un experto en la Biblia que genera reflexiones diarias inspiradoras."},
+                {"role": "user", "content": f"Genera una reflexión diaria basada en este versículo: {verse_text}"}
+            ],
+            max_tokens=200
+        )
+
+    async def generate_daily_reflection(self, verse_text):
         """Genera una reflexión diaria basada en un versículo"""
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "Eres un experto en la Biblia que genera reflexiones diarias inspiradoras."},
-                    {"role": "user", "content": f"Genera una reflexión diaria basada en este versículo: {verse_text}"}
-                ],
-                max_tokens=200
-            )
-            return response.choices[0].message.content
+            return await self._daily_reflection(verse_text)
         except Exception as e:
             print(f"Error al generar reflexión: {str(e)}")
             return "Lo siento, no pude generar una reflexión en este momento."
 
-    def get_chapter_explanation(self, chapter_text):
+    async def _summarize_chunk(self, chunk):
+        """Resumen de una sección del capítulo; siempre se reutiliza el mismo"""
+        return await self._complete(
+            'chapter_chunk_summary',
+            variants=1,
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "Eres un experto en la Biblia. Resumes pasajes de forma fiel y concisa, conservando los números de versículo de las ideas clave."},
+                {"role": "user", "content": f"Resume los temas y enseñanzas principales de estos versículos:\n\n{chunk}"}
+            ],
+            temperature=0,
+            max_tokens=200
+        )
+
+    async def _chapter_explanation_params(self, chapter_text):
+        """
+        Prompt de la explicación del capítulo. Si el capítulo no cabe en un
+        bloque se divide por versículos, se resumen los bloques en paralelo
+        y la explicación se genera a partir de esos resúmenes.
+        """
+        chunks = split_verses(chapter_text, self.chunk_tokens)
+        if len(chunks) <= 1:
+            prompt = f"Por favor, proporciona una explicación detallada del siguiente capítulo de la Biblia, incluyendo su contexto histórico, temas principales, enseñanzas clave y aplicación práctica para la vida actual:\n\n{chapter_text}"
+        else:
+            summaries = await asyncio.gather(*(self._summarize_chunk(chunk) for chunk in chunks))
+            sections = '\n\n'.join(
+                f"Sección {number} (versículos {verse_span(chunk)}):\n{summary}"
+                for number, (chunk, summary) in enumerate(zip(chunks, summaries), 1)
+            )
+            prompt = f"Por favor, proporciona una explicación detallada de un capítulo de la Biblia a partir de los siguientes resúmenes de sus secciones, incluyendo su contexto histórico, temas principales, enseñanzas clave y aplicación práctica para la vida actual:\n\n{sections}"
+        return dict(
+            model="gpt-4o-mini",
+            messages=[
+                {"role": "system", "content": "Eres un experto en teología y estudios bíblicos. Tu tarea es proporcionar explicaciones claras, profundas y significativas de capítulos de la Biblia, incluyendo su contexto histórico, significado teológico y aplicación práctica para la vida actual."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.7,
+            max_tokens=1000
+        )
+
+    async def get_chapter_explanation(self, chapter_text):
         """
         Genera una explicación detallada de un capítulo completo de la Biblia
         """
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "Eres un experto en teología y estudios bíblicos. Tu tarea es proporcionar explicaciones claras, profundas y significativas de capítulos de la Biblia, incluyendo su contexto histórico, significado teológico y aplicación práctica para la vida actual."},
-                    {"role": "user", "content": f"Por favor, proporciona una explicación detallada del siguiente capítulo de la Biblia, incluyendo su contexto histórico, temas principales, enseñanzas clave y aplicación práctica para la vida actual:\n\n{chapter_text}"}
-                ],
-                temperature=0.7,
-                max_tokens=1000
+            return await self._complete(
+                'chapter_explanation',
+                **(await self._chapter_explanation_params(chapter_text)),
+                timeout=self.timeout * 2
             )
             
-            return response.choices[0].message.content
-            
         except Exception as e:
             print(f"Error al generar la explicación del capítulo: {str(e)}")
-            return "Lo siento, hubo un error al generar la explicación del capítulo." 
\ No newline at end of file
+            return "Lo siento, hubo un error al generar la explicación del capítulo." 
+
+    async def stream_chapter_explanation(self, chapter_text):
+        """
+        Versión en streaming de get_chapter_explanation: entrega fragmentos de
+        texto a medida que el modelo los genera
+        """
+        try:
+            async for delta in self._stream(
+                'chapter_explanation',
+                **(await self._chapter_explanation_params(chapter_text)),
+                timeout=self.timeout * 2
+            ):
+                yield delta
+        except Exception as e:
+            print(f"Error al generar la explicación del capítulo: {str(e)}")
+            yield "\n\nLo siento, hubo un error al generar la explicación del capítulo."
@@ -0,0 +1,157 @@
+import asyncio
+import datetime
+import logging
+import os
+import sqlite3
+import time
+from bible.references import random_reference, reference_from_key
+
+logger = logging.getLogger('reflection_pool')
+
+DEFAULT_REFLECTION_POOL_PATH = os.getenv(
+    'REFLECTION_POOL_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'reflection_pool.db')
+)
+
+class ReflectionPool:
+    """
+    Reserva de reflexiones generadas de antemano para `!reflexion` sin
+    argumentos. Se rellena por lotes en segundo plano: cada noche a la hora
+    `refill_hour` y en cuanto quedan menos de `low_water` reflexiones.
+    """
+    def __init__(self, bible_helper, ai_helper, books=None, path=DEFAULT_REFLECTION_POOL_PATH,
+                 size=None, low_water=None, batch_size=10, refill_hour=None):
+        self.bible_helper = bible_helper
+        self.ai_helper = ai_helper
+        self.books = books
+        self.size = size or int(os.getenv('REFLECTION_POOL_SIZE', '60'))
+        self.low_water = low_water or int(os.getenv('REFLECTION_POOL_LOW_WATER', '15'))
+        self.batch_size = batch_size
+        # Hora local (0-23) de la recarga completa fuera de las horas de uso
+        self.refill_hour = refill_hour if refill_hour is not None else int(os.getenv('REFLECTION_REFILL_HOUR', '4'))
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS reflections (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                reference TEXT NOT NULL,
+                verse_text TEXT NOT NULL,
+                reflection TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        self.conn.commit()
+        self.count = self.conn.execute('SELECT COUNT(*) FROM reflections').fetchone()[0]
+        self._wanted = None
+        self._worker = None
+        self.served = 0
+        self.empty = 0
+        self.generated = 0
+
+    def __len__(self):
+        return self.count
+
+    def start(self):
+        """Arranca el worker de recarga; debe llamarse dentro del event loop del bot"""
+        if self._worker is None:
+            self._wanted = asyncio.Event()
+            self._worker = asyncio.create_task(self._run())
+            if self.count < self.low_water:
+                self._wanted.set()
+
+    def pop(self):
+        """Saca la reflexión más antigua: (Reference, texto, reflexión), o None si la reserva está vacía"""
+        row = self.conn.execute(
+            'SELECT id, reference, verse_text, reflection FROM reflections ORDER BY id LIMIT 1'
+        ).fetchone()
+        if row is None:
+            self.empty += 1
+            self._request_refill()
+            return None
+        self.conn.execute('DELETE FROM reflections WHERE id = ?', (row[0],))
+        self.conn.commit()
+        self.count -= 1
+        self.served += 1
+        if self.count < self.low_water:
+            self._request_refill()
+        return reference_from_key(row[1]), row[2], row[3]
+
+    def _request_refill(self):
+        if self._wanted is not None:
+            self._wanted.set()
+
+    def _seconds_until_refill_hour(self):
+        now = datetime.datetime.now()
+        target = now.replace(hour=self.refill_hour, minute=0, second=0, microsecond=0)
+        if target <= now:
+            target += datetime.timedelta(days=1)
+        return (target - now).total_seconds()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wanted.wait(), timeout=self._seconds_until_refill_hour())
+            except asyncio.TimeoutError:
+                pass
+            self._wanted.clear()
+            try:
+                await self.refill()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"No se pudo recargar la reserva de reflexiones: {str(e)}")
+
+    async def refill(self):
+        """Genera reflexiones por lotes hasta llenar la reserva"""
+        started = time.perf_counter()
+        added = 0
+        failures = 0
+        while self.count < self.size and failures < 3:
+            wanted = min(self.batch_size, self.size - self.count)
+            references = [random_reference(self.books) for _ in range(wanted)]
+            # Una consulta agrupada para todos los pasajes del lote; sin precargar los
+            # siguientes, que son al azar y nadie los va a pedir
+            passages = await self.bible_helper.get_passages(references, prefetch=False)
+            found = [
+                (reference, ' '.join(text for _, text in verses))
+                for reference, verses in zip(references, passages) if verses
+            ]
+            reflections = await asyncio.gather(
+                *(self.ai_helper._daily_reflection(text) for _, text in found),
+                return_exceptions=True
+            )
+            rows = [
+                (reference.key, text, reflection, time.time())
+                for (reference, text), reflection in zip(found, reflections)
+                if isinstance(reflection, str) and reflection
+            ]
+            if not rows:
+                failures += 1
+                continue
+            with self.conn:
+                self.conn.executemany(
+                    'INSERT INTO reflections (reference, verse_text, reflection, created_at) VALUES (?, ?, ?, ?)',
+                    rows
+                )
+            self.count += len(rows)
+            self.generated += len(rows)
+            added += len(rows)
+        logger.info(f"Reserva de reflexiones: {added} nuevas en {time.perf_counter() - started:.1f} s, {self.count} disponibles")
+        return added
+
+    def stats(self):
+        return {
+            'available': self.count,
+            'served': self.served,
+            'empty': self.empty,
+            'generated': self.generated,
+        }
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self.conn.close()
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import time
+
+DEFAULT_RESPONSE_CACHE_PATH = os.getenv(
+    'RESPONSE_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'response_cache.db')
+)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+def response_key(task, params):
+    """Hash del contenido de la petición: tarea, modelo, prompts normalizados y parámetros"""
+    messages = [
+        {'role': message['role'], 'content': _WHITESPACE_RE.sub(' ', message['content']).strip()}
+        for message in params.get('messages', [])
+    ]
+    payload = dict(params, messages=messages, task=task)
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """
+    Caché persistente de respuestas del modelo. Guarda hasta `variants`
+    respuestas por clave y devuelve una al azar para que no se repitan siempre.
+    """
+    def __init__(self, path=DEFAULT_RESPONSE_CACHE_PATH, variants=None, ttl=None,
+                 max_bytes=32 * 1024 * 1024, flush_every=64):
+        self.path = path
+        self.flush_every = flush_every
+        # Accesos pendientes de escribir: un acierto no escribe ni hace commit
+        self._accessed = {}
+        self.variants = variants or int(os.getenv('OPENAI_CACHE_VARIANTS', '1'))
+        self.ttl = ttl or int(os.getenv('OPENAI_CACHE_TTL', str(30 * 24 * 3600)))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stale_hits = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT NOT NULL,
+                variant INTEGER NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (key, variant)
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)')
+        self.conn.commit()
+        self.size_bytes = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, key, variants=None):
+        """Devuelve una respuesta guardada, o None si todavía faltan variantes por generar"""
+        now = time.time()
+        rows = self.conn.execute(
+            'SELECT variant, value FROM responses WHERE key = ? AND expires_at >= ?',
+            (key, now)
+        ).fetchall()
+        if not rows or len(rows) < (variants or self.variants):
+            self.misses += 1
+            return None
+        variant, value = random.choice(rows)
+        self._accessed[(key, variant)] = now
+        if len(self._accessed) >= self.flush_every:
+            self.flush()
+        self.hits += 1
+        return value
+
+    def flush(self):
+        """Escribe de una vez los accesos acumulados (un solo commit)"""
+        if not self._accessed:
+            return
+        self.conn.executemany(
+            'UPDATE responses SET accessed_at = ? WHERE key = ? AND variant = ?',
+            [(accessed_at, key, variant) for (key, variant), accessed_at in self._accessed.items()]
+        )
+        self._accessed.clear()
+        self.conn.commit()
+
+    def get_stale(self, key):
+        """Cualquier respuesta guardada para la clave, aunque haya caducado"""
+        row = self.conn.execute(
+            'SELECT value FROM responses WHERE key = ? ORDER BY expires_at DESC LIMIT 1', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        self.stale_hits += 1
+        return row[0]
+
+    def add(self, key, value):
+        """Guarda una respuesta nueva como otra variante de la clave"""
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        # Las variantes caducadas se reemplazan
+        expired = self.conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses WHERE key = ? AND expires_at < ?',
+            (key, now)
+        ).fetchone()[0]
+        self.conn.execute('DELETE FROM responses WHERE key = ? AND expires_at < ?', (key, now))
+        self.size_bytes -= expired
+
+        variant = self.conn.execute(
+            'SELECT COALESCE(MAX(variant), -1) + 1 FROM responses WHERE key = ?', (key,)
+        ).fetchone()[0]
+        self.conn.execute(
+            'INSERT INTO responses (key, variant, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)',
+            (key, variant, value, size, now + self.ttl, now)
+        )
+        self.size_bytes += size
+        self._evict()
+        self.conn.commit()
+
+    def _evict(self):
+        """Elimina las respuestas menos usadas hasta respetar el presupuesto de bytes"""
+        if self.size_bytes > self.max_bytes:
+            # El orden LRU tiene que ver los accesos que aún están en memoria
+            self.flush()
+        while self.size_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                'SELECT key, variant, size FROM responses ORDER BY accessed_at LIMIT 32'
+            ).fetchall()
+            if not rows:
+                break
+            for key, variant, size in rows:
+                if self.size_bytes <= self.max_bytes:
+                    break
+                self.conn.execute('DELETE FROM responses WHERE key = ? AND variant = ?', (key, variant))
+                self.size_bytes -= size
+                self.evictions += 1
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'stale_hits': self.stale_hits,
+            'bytes': self.size_bytes,
+        }
+
+    def close(self):
+        self.flush()
+        self.conn.close()
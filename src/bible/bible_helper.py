@@ -1,89 +1,201 @@
-import requests
-from bs4 import BeautifulSoup
-import re
+import asyncio
+import json
+import os
+from urllib.parse import quote_plus
+from bible.html_extractor import extract_passages
+from bible.http_client import HttpClient
+from bible.references import Reference, parse_reference
+from bible.passage_store import PassageStore
+from bible.passage_cache import PassageCache, cache_key
+from bible.prefetch import Prefetcher
+from utils.resilience import Resilience
+from utils.singleflight import SingleFlight
 
 class BibleHelper:
-    def __init__(self):
+    def __init__(self, http_client=None, store=None, cache=None, batch_size=10, resilience=None):
         self.bible_api_url = "https://www.biblegateway.com/passage/?search="
-        
+        # Máximo de referencias por consulta agrupada a biblegateway
+        self.batch_size = batch_size
+        # Cliente HTTP compartido por todas las consultas
+        self.http_client = http_client or HttpClient()
+        # Tiempo límite, reintentos y circuito para biblegateway; la petición duplicada
+        # cuando tarda es opcional (BIBLE_HEDGE_AFTER) para no cargar un sitio ajeno
+        hedge_after = os.getenv('BIBLE_HEDGE_AFTER')
+        self.resilience = resilience or Resilience(
+            'biblegateway',
+            timeout=self.http_client.timeout,
+            retries=2,
+            hedge_after=float(hedge_after) if hedge_after else None
+        )
+        # Texto local; solo se consulta la red si el pasaje no está aquí
+        self.store = store or PassageStore()
+        # Caché de pasajes descargados (memoria + disco)
+        self.cache = cache or PassageCache()
+        # Consultas iguales en curso comparten una sola descarga
+        self.singleflight = SingleFlight()
+        # Precarga en segundo plano; el bot la arranca al iniciar
+        self.prefetcher = Prefetcher(self)
+
+    @staticmethod
+    def _resolve(reference):
+        """Convierte el texto en una referencia canónica antes de cualquier consulta"""
+        if isinstance(reference, Reference):
+            return reference
+        return parse_reference(reference)
+
+    async def _fetch_html(self, references):
+        """Descarga una página con una o varias referencias separadas por ';'"""
+        # Codificar las referencias canónicas para la URL
+        encoded_reference = quote_plus('; '.join(reference.display for reference in references))
+
+        # Hacer la petición a la API
+        url = f"{self.bible_api_url}{encoded_reference}&version=RVR1960"
+        return await self.resilience.call(self.http_client.get_text, url)
+
+    async def _fetch_passage(self, reference):
+        """Descarga la página del pasaje y devuelve sus versículos ya limpios"""
+        html = await self._fetch_html([reference])
+        passages = extract_passages(html)
+        if not passages or not passages[0]:
+            raise Exception("No se encontró el pasaje solicitado.")
+        verses = self._match(reference, [verse for passage in passages for verse in passage])
+        if not verses:
+            # Las clases de los versículos no coinciden con la referencia: se muestra el primer
+            # pasaje, pero no se guarda en la caché para no fijar un texto quizá equivocado
+            return [(verse.verse, verse.text) for verse in passages[0]]
+        self.cache.set(cache_key('passage', reference), json.dumps(verses, ensure_ascii=False))
+        return verses
+
+    async def get_verses(self, reference, prefetch=True):
+        """Devuelve [(versículo, texto)]: primero el almacén local, luego la caché y por último la red"""
+        reference = self._resolve(reference)
+        verses = self.store.lookup(reference)
+        if verses:
+            return verses
+
+        if prefetch:
+            self.cache.record_use(reference.key)
+            self.prefetcher.schedule(reference)
+        verses = self._lookup_local(reference)
+        if verses:
+            return verses
+        try:
+            return await self.singleflight.do(reference.key, self._fetch_passage, reference)
+        except Exception:
+            # Si biblegateway falla o el circuito está abierto, servir la copia caducada
+            verses = self._lookup_local(reference, stale=True)
+            if verses:
+                return verses
+            raise
+
+    def _lookup_local(self, reference, stale=False):
+        """Busca en el almacén y la caché sin tocar la red (con stale, también lo caducado)"""
+        verses = self.store.lookup(reference)
+        if verses:
+            return verses
+        get = self.cache.get_stale if stale else self.cache.get
+        cached = get(cache_key('passage', reference))
+        if cached is not None:
+            return [tuple(verse) for verse in json.loads(cached)]
+        if reference.start is not None:
+            # Un versículo también se puede servir desde su capítulo ya precargado
+            chapter = Reference(reference.book, reference.chapter, None, None)
+            cached = get(cache_key('passage', chapter))
+            if cached is not None:
+                verses = [tuple(verse) for verse in json.loads(cached) if reference.start <= verse[0] <= reference.end]
+                if verses:
+                    return verses
+        return None
+
+    @staticmethod
+    def _match(reference, verses):
+        """Filtra los versículos extraídos que pertenecen a la referencia"""
+        return [
+            (verse.verse, verse.text) for verse in verses
+            if verse.book == reference.book.osis
+            and verse.chapter == reference.chapter
+            and (reference.start is None or reference.start <= verse.verse <= reference.end)
+        ]
+
+    async def _fetch_batch(self, references):
+        """Descarga varias referencias en una sola petición y reparte los versículos"""
+        html = await self._fetch_html(references)
+        verses = [verse for passage in extract_passages(html) for verse in passage]
+
+        results = {}
+        for reference in references:
+            matched = self._match(reference, verses)
+            if matched:
+                self.cache.set(cache_key('passage', reference), json.dumps(matched, ensure_ascii=False))
+                results[reference.key] = matched
+        return results
+
+    async def get_passages(self, references, prefetch=True):
+        """
+        Devuelve los versículos de varias referencias con el menor número de
+        peticiones posible. El resultado sigue el orden de entrada; las
+        referencias que no se pudieron obtener quedan como None.
+        """
+        references = [self._resolve(reference) for reference in references]
+        found = {}
+        pending = []
+        for reference in references:
+            if reference.key in found or reference in pending:
+                continue
+            verses = self._lookup_local(reference)
+            if verses:
+                found[reference.key] = verses
+            else:
+                pending.append(reference)
+
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        results = await asyncio.gather(
+            *(self.singleflight.do('; '.join(r.key for r in batch), self._fetch_batch, batch) for batch in batches),
+            return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, dict):
+                found.update(result)
+
+        # Lo que no se pudo separar de la respuesta agrupada se pide por separado
+        missing = [reference for reference in pending if reference.key not in found]
+        retries = await asyncio.gather(
+            *(self.get_verses(reference, prefetch=prefetch) for reference in missing), return_exceptions=True
+        )
+        for reference, verses in zip(missing, retries):
+            if not isinstance(verses, BaseException):
+                found[reference.key] = verses
+
+        return [found.get(reference.key) for reference in references]
+
     async def get_verse(self, reference):
         """Obtiene un versículo específico de la Biblia"""
         try:
-            # Codificar la referencia para la URL
-            encoded_reference = reference.replace(' ', '+')
-            
-            # Hacer la petición a la API
-            url = f"{self.bible_api_url}{encoded_reference}&version=RVR1960"
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'es-ES,es;q=0.8,en-US;q=0.5,en;q=0.3',
-                'Connection': 'keep-alive',
-            }
-            
-            response = requests.get(url, headers=headers)
-            if response.status_code != 200:
-                raise Exception("Error al obtener el versículo. Por favor, verifica la referencia.")
-                
-            # Parsear el HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Buscar el texto del versículo
-            verse_text = soup.find('div', class_='passage-text')
-            if not verse_text:
-                raise Exception("No se encontró el versículo solicitado.")
-                
-            # Limpiar el texto
-            verse_text = verse_text.get_text().strip()
-            verse_text = re.sub(r'Read full chapter.*$', '', verse_text, flags=re.IGNORECASE | re.MULTILINE)
-            verse_text = re.sub(r'Cross references.*$', '', verse_text, flags=re.IGNORECASE | re.MULTILINE)
-            verse_text = re.sub(r'Mateo \d+:\d+ in all Spanish translations.*$', '', verse_text, flags=re.IGNORECASE | re.MULTILINE)
-            verse_text = re.sub(r'^\d+\s*', '', verse_text)  # Eliminar números al inicio
-            verse_text = re.sub(r'\([A-Z]\)', '', verse_text)  # Eliminar letras entre paréntesis
-            verse_text = verse_text.strip()
-            
-            return verse_text
-            
+            verses = await self.get_verses(reference)
+            return ' '.join(text for _, text in verses)
         except Exception as e:
             raise Exception(f"Error al obtener el versículo: {str(e)}")
-            
+
     async def get_chapter(self, reference):
         """Obtiene un capítulo completo de la Biblia"""
         try:
-            # Codificar la referencia para la URL
-            encoded_reference = reference.replace(' ', '+')
-            
-            # Hacer la petición a la API
-            url = f"{self.bible_api_url}{encoded_reference}&version=RVR1960"
-            
-            headers = {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Language': 'es-ES,es;q=0.8,en-US;q=0.5,en;q=0.3',
-                'Connection': 'keep-alive',
-            }
-            
-            response = requests.get(url, headers=headers)
-            if response.status_code != 200:
-                raise Exception("Error al obtener el capítulo. Por favor, verifica la referencia.")
-                
-            # Parsear el HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Buscar el texto del capítulo
-            chapter_text = soup.find('div', class_='passage-text')
-            if not chapter_text:
-                raise Exception("No se encontró el capítulo solicitado.")
-                
-            # Limpiar el texto
-            chapter_text = chapter_text.get_text().strip()
-            chapter_text = re.sub(r'Read full chapter.*$', '', chapter_text, flags=re.IGNORECASE | re.MULTILINE)
-            chapter_text = re.sub(r'Cross references.*$', '', chapter_text, flags=re.IGNORECASE | re.MULTILINE)
-            chapter_text = re.sub(r'Mateo \d+:\d+ in all Spanish translations.*$', '', chapter_text, flags=re.IGNORECASE | re.MULTILINE)
-            chapter_text = chapter_text.strip()
-            
-            return chapter_text
-            
+            verses = await self.get_verses(reference)
+            return '\n'.join(f"{verse} {text}" for verse, text in verses)
         except Exception as e:
-            raise Exception(f"Error al obtener el capítulo: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Error al obtener el capítulo: {str(e)}")
+
+    def stats(self):
+        """Métricas de la caché, la precarga y el acceso a biblegateway"""
+        return {
+            'cache': self.cache.stats(),
+            'coalesced': self.singleflight.saved,
+            'prefetch': self.prefetcher.stats(),
+            'upstream': self.resilience.stats(),
+        }
+
+    async def close(self):
+        """Detiene la precarga y cierra el cliente HTTP compartido"""
+        await self.prefetcher.stop()
+        await self.http_client.close()
+        self.store.close()
+        self.cache.close()
@@ -0,0 +1,113 @@
+import re
+from collections import namedtuple
+from html.parser import HTMLParser
+
+Verse = namedtuple('Verse', ['book', 'chapter', 'verse', 'text'])
+
+# Elementos sin etiqueta de cierre
+_VOID_TAGS = {'area', 'base', 'br', 'col', 'hr', 'img', 'input', 'link', 'meta', 'source', 'wbr'}
+# Números de versículo, notas, referencias cruzadas, títulos y enlaces auxiliares
+_SKIP_TAGS = {'sup', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'script', 'style'}
+_SKIP_CLASSES = {
+    'versenum', 'chapternum', 'footnote', 'crossreference', 'footnotes', 'crossrefs',
+    'full-chap-link', 'passage-other-trans', 'publisher-info-bottom',
+}
+_VERSE_CLASS_RE = re.compile(r'^([1-3]?[A-Za-z]+)-(\d+)-(\d+)$')
+_WHITESPACE_RE = re.compile(r'\s+')
+_PASSAGE_MARKER = 'passage-text'
+_CHUNK_SIZE = 16 * 1024
+
+class _PassageParser(HTMLParser):
+    """Recorre una sola vez los div 'passage-text' y junta el texto de cada versículo"""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.passages = []
+        self._depth = 0
+        self._skip_depth = None
+        self._verse_depth = None
+        self._verse = None
+        self._parts = {}
+
+    def handle_starttag(self, tag, attrs):
+        classes = ()
+        for name, value in attrs:
+            if name == 'class' and value:
+                classes = value.split()
+                break
+
+        if self._depth == 0:
+            if tag == 'div' and _PASSAGE_MARKER in classes:
+                self._depth = 1
+                self._verse = None
+                self._parts = {}
+                self.passages.append(self._parts)
+            return
+
+        if tag in _VOID_TAGS:
+            if tag == 'br' and self._verse is not None and self._skip_depth is None:
+                self._parts[self._verse].append(' ')
+            return
+
+        self._depth += 1
+        if self._skip_depth is None and (tag in _SKIP_TAGS or _SKIP_CLASSES.intersection(classes)):
+            self._skip_depth = self._depth
+        elif tag == 'span' and 'text' in classes:
+            for name in classes:
+                match = _VERSE_CLASS_RE.match(name)
+                if match:
+                    self._verse = (match.group(1), int(match.group(2)), int(match.group(3)))
+                    self._verse_depth = self._depth
+                    # Un versículo puede venir partido en varias líneas de poesía
+                    self._parts.setdefault(self._verse, []).append(' ')
+                    break
+
+    def handle_startendtag(self, tag, attrs):
+        # Las etiquetas autocerradas (<br/>, <div/>) nunca abren un nivel nuevo
+        if tag == 'br':
+            self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if self._depth == 0 or tag in _VOID_TAGS:
+            return
+        if self._skip_depth == self._depth:
+            self._skip_depth = None
+        if self._verse_depth == self._depth:
+            self._verse_depth = None
+        self._depth -= 1
+
+    def handle_data(self, data):
+        if self._verse_depth is not None and self._skip_depth is None:
+            self._parts[self._verse].append(data)
+
+def extract_passages(html):
+    """
+    Devuelve una lista de pasajes (uno por div 'passage-text'), cada uno como
+    lista de Verse(libro OSIS, capítulo, versículo, texto) sin números ni notas
+    """
+    parser = _PassageParser()
+    position = 0
+    marker = -1
+    while True:
+        if parser._depth == 0:
+            # Fuera de un pasaje: saltar directamente al siguiente, sin tokenizar lo demás
+            consumed = position - len(parser.rawdata)
+            marker = html.find(_PASSAGE_MARKER, max(consumed, marker + 1))
+            if marker == -1:
+                break
+            parser.reset()
+            position = max(html.rfind('<', 0, marker), 0)
+        if position >= len(html):
+            break
+        parser.feed(html[position:position + _CHUNK_SIZE])
+        position += _CHUNK_SIZE
+    parser.close()
+
+    passages = []
+    for parts in parser.passages:
+        verses = []
+        for (book, chapter, verse), chunks in parts.items():
+            text = _WHITESPACE_RE.sub(' ', ''.join(chunks)).strip()
+            if text:
+                verses.append(Verse(book, chapter, verse, text))
+        passages.append(verses)
+    return passages
@@ -0,0 +1,63 @@
+import asyncio
+import aiohttp
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'es-ES,es;q=0.8,en-US;q=0.5,en;q=0.3',
+    'Connection': 'keep-alive',
+}
+
+class HttpError(Exception):
+    """Error HTTP con el código de estado de la respuesta"""
+    def __init__(self, status):
+        super().__init__(f"Respuesta HTTP {status}")
+        self.status = status
+
+class HttpClient:
+    """Cliente HTTP asíncrono compartido con pool de conexiones y concurrencia limitada"""
+    def __init__(self, max_connections=20, max_concurrency=8, timeout=10,
+                 connect_timeout=5, dns_ttl=300, keepalive_timeout=30):
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.dns_ttl = dns_ttl
+        self.keepalive_timeout = keepalive_timeout
+
+        # La sesión y el semáforo se crean dentro del event loop del bot
+        self._session = None
+        self._semaphore = None
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=self.keepalive_timeout
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=DEFAULT_HEADERS,
+                timeout=aiohttp.ClientTimeout(total=self.timeout, connect=self.connect_timeout)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def get_text(self, url, params=None, timeout=None):
+        """Hace un GET y devuelve el cuerpo como texto"""
+        session = self._get_session()
+        kwargs = {'params': params}
+        if timeout:
+            kwargs['timeout'] = aiohttp.ClientTimeout(total=timeout, connect=self.connect_timeout)
+        async with self._semaphore:
+            async with session.get(url, **kwargs) as response:
+                if response.status != 200:
+                    raise HttpError(response.status)
+                return await response.text()
+
+    async def close(self):
+        """Cierra la sesión y libera las conexiones del pool"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
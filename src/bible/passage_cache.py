@@ -0,0 +1,245 @@
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_PATH = os.getenv(
+    'PASSAGE_CACHE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'passage_cache.db')
+)
+
+def cache_key(kind, reference):
+    """Clave a partir de la referencia canónica: 'juan 3:16' y 'Jn 3:16' comparten entrada"""
+    return f"{kind}:{reference.key}"
+
+class LRUCache:
+    """Caché en memoria limitada por número de entradas, bytes y TTL"""
+    def __init__(self, max_entries=512, max_bytes=4 * 1024 * 1024, ttl=24 * 3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self.size_bytes = 0
+        self.evictions = 0
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at < time.time():
+            self._remove(key)
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        if key in self._data:
+            self._remove(key)
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        self._data[key] = (value, time.time() + self.ttl)
+        self.size_bytes += size
+        while len(self._data) > self.max_entries or self.size_bytes > self.max_bytes:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        value, _ = self._data.pop(key)
+        self.size_bytes -= len(value.encode('utf-8'))
+
+    def __len__(self):
+        return len(self._data)
+
+class DiskCache:
+    """Caché persistente en SQLite que sobrevive a los reinicios del bot"""
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=64 * 1024 * 1024, ttl=30 * 24 * 3600,
+                 flush_every=256):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.flush_every = flush_every
+        self.evictions = 0
+        # Últimos accesos y usos pendientes de escribir: una lectura no escribe ni hace commit
+        self._accessed = {}
+        self._usage = {}
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS passages (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_passages_accessed ON passages (accessed_at)')
+        # Uso por referencia, independiente de las expulsiones de la caché
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS usage (
+                key TEXT PRIMARY KEY,
+                hits INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+        ''')
+        self.conn.commit()
+        self.size_bytes = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM passages').fetchone()[0]
+
+    def get(self, key, allow_stale=False):
+        """
+        Las entradas caducadas no se borran al leerlas: se siguen pudiendo
+        servir con allow_stale mientras biblegateway no responde
+        """
+        row = self.conn.execute('SELECT value, expires_at FROM passages WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        now = time.time()
+        if expires_at < now and not allow_stale:
+            return None
+        self._accessed[key] = now
+        if len(self._accessed) >= self.flush_every:
+            self.flush()
+        return value
+
+    def flush(self):
+        """Escribe de una vez los accesos y usos acumulados (un solo commit)"""
+        if not self._accessed and not self._usage:
+            return
+        self.conn.executemany(
+            'UPDATE passages SET accessed_at = ? WHERE key = ?',
+            [(accessed_at, key) for key, accessed_at in self._accessed.items()]
+        )
+        self.conn.executemany(
+            'INSERT INTO usage (key, hits, last_used) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET hits = hits + excluded.hits, last_used = excluded.last_used',
+            [(key, hits, last_used) for key, (hits, last_used) in self._usage.items()]
+        )
+        self._accessed.clear()
+        self._usage.clear()
+        self.conn.commit()
+
+    def set(self, key, value):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        self.delete(key)
+        now = time.time()
+        self.conn.execute(
+            'INSERT INTO passages (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+            (key, value, size, now + self.ttl, now)
+        )
+        self.size_bytes += size
+        self._accessed.pop(key, None)
+        self._evict()
+        self.conn.commit()
+
+    def delete(self, key):
+        row = self.conn.execute('SELECT size FROM passages WHERE key = ?', (key,)).fetchone()
+        if row:
+            self.conn.execute('DELETE FROM passages WHERE key = ?', (key,))
+            self.size_bytes -= row[0]
+
+    def _evict(self):
+        """Elimina las entradas menos usadas hasta respetar el presupuesto de bytes"""
+        if self.size_bytes > self.max_bytes:
+            # El orden LRU tiene que ver los accesos que aún están en memoria
+            self.flush()
+        while self.size_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                'SELECT key, size FROM passages ORDER BY accessed_at LIMIT 32'
+            ).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self.size_bytes <= self.max_bytes:
+                    break
+                self.conn.execute('DELETE FROM passages WHERE key = ?', (key,))
+                self.size_bytes -= size
+                self.evictions += 1
+
+    def record_use(self, key):
+        """Cuenta el uso en memoria; se escribe en el siguiente flush"""
+        hits, _ = self._usage.get(key, (0, 0.0))
+        self._usage[key] = (hits + 1, time.time())
+        if len(self._usage) >= self.flush_every:
+            self.flush()
+
+    def most_requested(self, limit, since):
+        self.flush()
+        rows = self.conn.execute(
+            'SELECT key FROM usage WHERE last_used >= ? ORDER BY hits DESC LIMIT ?',
+            (since, limit)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+class PassageCache:
+    """Caché de dos niveles: LRU en memoria delante de una caché en disco"""
+    def __init__(self, memory=None, disk=None):
+        self.memory = memory if memory is not None else LRUCache()
+        self.disk = disk if disk is not None else DiskCache()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        value = self.disk.get(key)
+        if value is not None:
+            self.disk_hits += 1
+            # Subir la entrada al nivel en memoria
+            self.memory.set(key, value)
+            return value
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        self.disk.set(key, value)
+
+    def get_stale(self, key):
+        """Entrada del disco aunque haya caducado; solo para cuando no hay red"""
+        value = self.disk.get(key, allow_stale=True)
+        if value is not None:
+            self.stale_hits += 1
+        return value
+
+    def flush(self):
+        """Escribe en disco los accesos pendientes"""
+        self.disk.flush()
+
+    def record_use(self, key):
+        """Registra que un usuario pidió la referencia (para precargar al arrancar)"""
+        self.disk.record_use(key)
+
+    def most_requested(self, limit=50, days=14):
+        """Claves de referencia más pedidas en los últimos días"""
+        return self.disk.most_requested(limit, time.time() - days * 24 * 3600)
+
+    def stats(self):
+        """Contadores de aciertos, fallos y expulsiones de ambos niveles"""
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'stale_hits': self.stale_hits,
+            'memory_evictions': self.memory.evictions,
+            'disk_evictions': self.disk.evictions,
+            'memory_entries': len(self.memory),
+            'memory_bytes': self.memory.size_bytes,
+            'disk_bytes': self.disk.size_bytes,
+        }
+
+    def close(self):
+        self.disk.close()
@@ -0,0 +1,121 @@
+import json
+import os
+import sqlite3
+import sys
+from bible.references import BOOKS, find_book
+
+DEFAULT_STORE_PATH = os.getenv(
+    'BIBLE_STORE_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'rvr1960.db')
+)
+
+class PassageStore:
+    """Texto bíblico local en SQLite indexado por (libro OSIS, capítulo, versículo)"""
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._conn = None
+
+    @property
+    def available(self):
+        """Indica si el almacén existe y ya fue importado"""
+        return self._connect() is not None
+
+    def _connect(self):
+        if self._conn is None and os.path.exists(self.path):
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            try:
+                if conn.execute('SELECT 1 FROM verses LIMIT 1').fetchone():
+                    self._conn = conn
+            except sqlite3.Error:
+                conn.close()
+        return self._conn
+
+    def get_verses(self, book, chapter, start=None, end=None):
+        """Devuelve [(versículo, texto)] de un capítulo, opcionalmente acotado"""
+        conn = self._connect()
+        if conn is None:
+            return []
+        if start is None:
+            cursor = conn.execute(
+                'SELECT verse, text FROM verses WHERE book = ? AND chapter = ? ORDER BY verse',
+                (book, chapter)
+            )
+        else:
+            cursor = conn.execute(
+                'SELECT verse, text FROM verses WHERE book = ? AND chapter = ? AND verse BETWEEN ? AND ? ORDER BY verse',
+                (book, chapter, start, end or start)
+            )
+        return cursor.fetchall()
+
+    def lookup(self, reference):
+        """Busca una referencia canónica; devuelve None si no está en el almacén"""
+        return self.get_verses(reference.book.osis, reference.chapter, reference.start, reference.end) or None
+
+    def iter_verses(self):
+        """Recorre todo el texto como (libro, capítulo, versículo, texto)"""
+        conn = self._connect()
+        if conn is None:
+            return iter(())
+        return conn.execute('SELECT book, chapter, verse, text FROM verses')
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+def import_json(source, path=DEFAULT_STORE_PATH):
+    """
+    Importa el texto desde un JSON con la forma
+    [{"name": "Génesis", "chapters": [["versículo 1", "versículo 2", ...], ...]}, ...]
+    """
+    with open(source, encoding='utf-8-sig') as f:
+        books = json.load(f)
+
+    # Si vienen los 66 libros se asume el orden canónico; si no, se resuelven por nombre
+    if len(books) == len(BOOKS):
+        osis_codes = [book.osis for book in BOOKS]
+    else:
+        osis_codes = []
+        for book in books:
+            found = find_book(book['name'])
+            if found is None:
+                raise ValueError(f"Libro desconocido: {book['name']}")
+            osis_codes.append(found.osis)
+
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute('''
+            CREATE TABLE verses (
+                book TEXT NOT NULL,
+                chapter INTEGER NOT NULL,
+                verse INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (book, chapter, verse)
+            ) WITHOUT ROWID
+        ''')
+        rows = (
+            (osis, chapter, verse, text.strip())
+            for osis, book in zip(osis_codes, books)
+            for chapter, verses in enumerate(book['chapters'], start=1)
+            for verse, text in enumerate(verses, start=1)
+        )
+        with conn:
+            conn.executemany('INSERT INTO verses VALUES (?, ?, ?, ?)', rows)
+        count = conn.execute('SELECT COUNT(*) FROM verses').fetchone()[0]
+    finally:
+        conn.close()
+
+    # Reemplazar el almacén de forma atómica para no dejar lectores a medias
+    os.replace(tmp_path, path)
+    return count
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Uso: python -m bible.passage_store <biblia.json> [destino.db]")
+        sys.exit(1)
+    destino = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_STORE_PATH
+    total = import_json(sys.argv[1], destino)
+    print(f"Se importaron {total} versículos en {destino}")
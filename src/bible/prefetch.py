@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import time
+from bible.references import Reference, next_chapter, reference_from_key
+
+logger = logging.getLogger('prefetch')
+
+class Prefetcher:
+    """
+    Precarga en segundo plano el capítulo de cada consulta y el siguiente.
+    Trabaja de a una petición, solo cuando no hay consultas de usuarios en
+    curso, y con una cola acotada que descarta lo que no quepa. También
+    escribe en disco cada `flush_interval` segundos los accesos y usos que
+    la caché acumula en memoria.
+    """
+    def __init__(self, bible_helper, max_queue=32, idle_delay=0.25, pause=0.5, flush_interval=30):
+        self.bible_helper = bible_helper
+        self.max_queue = max_queue
+        self.idle_delay = idle_delay
+        self.pause = pause
+        self.flush_interval = flush_interval
+        self._queue = None
+        self._queued = set()
+        self._worker = None
+        self._warming = None
+        self._last_flush = time.monotonic()
+        self.warmed = 0
+        self.prefetched = 0
+        self.skipped = 0
+        self.dropped = 0
+
+    def start(self):
+        """Arranca el worker; debe llamarse dentro del event loop del bot"""
+        if self._worker is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._worker = asyncio.create_task(self._run())
+
+    def schedule(self, reference):
+        """Encola el capítulo que contiene la referencia y el siguiente"""
+        if self._queue is None:
+            return
+        chapter = Reference(reference.book, reference.chapter, None, None)
+        for candidate in (chapter, next_chapter(chapter)):
+            if candidate is not None:
+                self._enqueue(candidate)
+
+    def _enqueue(self, reference):
+        if reference.key in self._queued:
+            return
+        try:
+            self._queue.put_nowait(reference)
+            self._queued.add(reference.key)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def warm_up(self, limit=30):
+        """Precarga los pasajes más pedidos recientemente (p. ej. tras un despliegue)"""
+        references = []
+        for key in self.bible_helper.cache.most_requested(limit):
+            try:
+                reference = reference_from_key(key)
+            except ValueError:
+                continue
+            if not self.bible_helper._lookup_local(reference):
+                references.append(reference)
+        logger.info(f"Precarga inicial: {len(references)} pasajes por descargar")
+        if references and self._warming is None:
+            self._warming = asyncio.create_task(self._warm(references))
+
+    async def _warm(self, references):
+        # Consultas agrupadas: un lote de referencias por petición a biblegateway
+        batch_size = self.bible_helper.batch_size
+        for i in range(0, len(references), batch_size):
+            while self.bible_helper.singleflight.stats()['in_flight'] > 0:
+                await asyncio.sleep(self.idle_delay)
+            try:
+                passages = await self.bible_helper.get_passages(references[i:i + batch_size], prefetch=False)
+                self.warmed += sum(1 for verses in passages if verses)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"No se pudo completar la precarga inicial: {str(e)}")
+            await asyncio.sleep(self.pause)
+
+    def _flush_if_due(self):
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self._last_flush = time.monotonic()
+            try:
+                self.bible_helper.cache.flush()
+            except Exception as e:
+                logger.warning(f"No se pudo escribir el uso de la caché: {str(e)}")
+
+    async def _run(self):
+        while True:
+            try:
+                reference = await asyncio.wait_for(self._queue.get(), self.flush_interval)
+            except asyncio.TimeoutError:
+                self._flush_if_due()
+                continue
+            try:
+                # Ceder siempre el paso a las consultas de los usuarios
+                while self.bible_helper.singleflight.stats()['in_flight'] > 0:
+                    await asyncio.sleep(self.idle_delay)
+
+                if self.bible_helper._lookup_local(reference):
+                    self.skipped += 1
+                    continue
+                await self.bible_helper.get_verses(reference, prefetch=False)
+                self.prefetched += 1
+                await asyncio.sleep(self.pause)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"No se pudo precargar {reference}: {str(e)}")
+            finally:
+                self._queued.discard(reference.key)
+                self._queue.task_done()
+                self._flush_if_due()
+
+    def stats(self):
+        return {
+            'prefetched': self.prefetched,
+            'warmed': self.warmed,
+            'skipped': self.skipped,
+            'dropped': self.dropped,
+            'queued': len(self._queued),
+        }
+
+    async def stop(self):
+        if self._warming is not None:
+            self._warming.cancel()
+            self._warming = None
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
@@ -0,0 +1,268 @@
+import bisect
+import random
+import re
+import unicodedata
+from collections import namedtuple
+from bible.versification import VERSES, chapter_count, verse_count
+
+Book = namedtuple('Book', ['osis', 'name', 'index'])
+
+class InvalidReference(ValueError):
+    """La referencia bíblica no se pudo interpretar"""
+
+class Reference(namedtuple('Reference', ['book', 'chapter', 'start', 'end'])):
+    """Referencia canónica: libro, capítulo y rango de versículos (opcional)"""
+    __slots__ = ()
+
+    @property
+    def key(self):
+        """Clave canónica usada por cachés, base de datos y consultas externas"""
+        if self.start is None:
+            return f"{self.book.osis}.{self.chapter}"
+        if self.start == self.end:
+            return f"{self.book.osis}.{self.chapter}.{self.start}"
+        return f"{self.book.osis}.{self.chapter}.{self.start}-{self.end}"
+
+    @property
+    def display(self):
+        if self.start is None:
+            return f"{self.book.name} {self.chapter}"
+        if self.start == self.end:
+            return f"{self.book.name} {self.chapter}:{self.start}"
+        return f"{self.book.name} {self.chapter}:{self.start}-{self.end}"
+
+    def __str__(self):
+        return self.display
+
+# (código OSIS, nombre RVR1960, número del libro, abreviaturas)
+_BOOK_TABLE = [
+    ('Gen', 'Génesis', None, ['gen', 'gn', 'ge']),
+    ('Exod', 'Éxodo', None, ['ex', 'exo', 'exod']),
+    ('Lev', 'Levítico', None, ['lev', 'lv']),
+    ('Num', 'Números', None, ['num', 'nm']),
+    ('Deut', 'Deuteronomio', None, ['deut', 'deu', 'dt']),
+    ('Josh', 'Josué', None, ['jos']),
+    ('Judg', 'Jueces', None, ['jue', 'jc']),
+    ('Ruth', 'Rut', None, ['rt', 'ruth']),
+    ('1Sam', 'Samuel', 1, ['sam', 'sa', 's']),
+    ('2Sam', 'Samuel', 2, ['sam', 'sa', 's']),
+    ('1Kgs', 'Reyes', 1, ['rey', 're', 'r']),
+    ('2Kgs', 'Reyes', 2, ['rey', 're', 'r']),
+    ('1Chr', 'Crónicas', 1, ['cron', 'cro', 'cr']),
+    ('2Chr', 'Crónicas', 2, ['cron', 'cro', 'cr']),
+    ('Ezra', 'Esdras', None, ['esd']),
+    ('Neh', 'Nehemías', None, ['neh']),
+    ('Esth', 'Ester', None, ['est']),
+    ('Job', 'Job', None, ['jb']),
+    ('Ps', 'Salmos', None, ['salmo', 'sal', 'sl', 'slm']),
+    ('Prov', 'Proverbios', None, ['prov', 'pro', 'pr']),
+    ('Eccl', 'Eclesiastés', None, ['ecl', 'ec']),
+    ('Song', 'Cantares', None, ['cantar de los cantares', 'cantar', 'cant', 'cnt']),
+    ('Isa', 'Isaías', None, ['isa', 'is']),
+    ('Jer', 'Jeremías', None, ['jer', 'jr']),
+    ('Lam', 'Lamentaciones', None, ['lam']),
+    ('Ezek', 'Ezequiel', None, ['eze', 'ez']),
+    ('Dan', 'Daniel', None, ['dan', 'dn']),
+    ('Hos', 'Oseas', None, ['os']),
+    ('Joel', 'Joel', None, ['jl']),
+    ('Amos', 'Amós', None, ['am']),
+    ('Obad', 'Abdías', None, ['abd']),
+    ('Jonah', 'Jonás', None, ['jon']),
+    ('Mic', 'Miqueas', None, ['miq']),
+    ('Nah', 'Nahúm', None, ['nah']),
+    ('Hab', 'Habacuc', None, ['hab']),
+    ('Zeph', 'Sofonías', None, ['sof']),
+    ('Hag', 'Hageo', None, ['hag']),
+    ('Zech', 'Zacarías', None, ['zac']),
+    ('Mal', 'Malaquías', None, ['mal']),
+    ('Matt', 'Mateo', None, ['mat', 'mt']),
+    ('Mark', 'Marcos', None, ['mar', 'mc', 'mr']),
+    ('Luke', 'Lucas', None, ['luc', 'lc']),
+    ('John', 'Juan', None, ['jua', 'jn']),
+    ('Acts', 'Hechos', None, ['hechos de los apostoles', 'hech', 'hch']),
+    ('Rom', 'Romanos', None, ['rom', 'ro']),
+    ('1Cor', 'Corintios', 1, ['cor', 'co']),
+    ('2Cor', 'Corintios', 2, ['cor', 'co']),
+    ('Gal', 'Gálatas', None, ['gal', 'ga']),
+    ('Eph', 'Efesios', None, ['efe', 'ef']),
+    ('Phil', 'Filipenses', None, ['fil', 'flp']),
+    ('Col', 'Colosenses', None, ['col']),
+    ('1Thess', 'Tesalonicenses', 1, ['tes', 'ts']),
+    ('2Thess', 'Tesalonicenses', 2, ['tes', 'ts']),
+    ('1Tim', 'Timoteo', 1, ['tim', 'ti']),
+    ('2Tim', 'Timoteo', 2, ['tim', 'ti']),
+    ('Titus', 'Tito', None, ['tit']),
+    ('Phlm', 'Filemón', None, ['filem', 'flm']),
+    ('Heb', 'Hebreos', None, ['heb']),
+    ('Jas', 'Santiago', None, ['sant', 'stg']),
+    ('1Pet', 'Pedro', 1, ['ped', 'pe', 'p']),
+    ('2Pet', 'Pedro', 2, ['ped', 'pe', 'p']),
+    ('1John', 'Juan', 1, ['jua', 'jn']),
+    ('2John', 'Juan', 2, ['jua', 'jn']),
+    ('3John', 'Juan', 3, ['jua', 'jn']),
+    ('Jude', 'Judas', None, ['jud']),
+    ('Rev', 'Apocalipsis', None, ['apoc', 'ap']),
+]
+
+_NUMBER_WORDS = {
+    1: ['1', '1ra', '1ro', '1era', '1er', '1a', '1o', 'i', 'primera', 'primero', 'primer'],
+    2: ['2', '2da', '2do', '2a', '2o', 'ii', 'segunda', 'segundo'],
+    3: ['3', '3ra', '3ro', '3era', '3er', '3a', '3o', 'iii', 'tercera', 'tercero', 'tercer'],
+}
+
+def fold(text):
+    """Quita acentos, pasa a minúsculas y colapsa los espacios"""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(text.lower().split())
+
+BOOKS = []
+_ALIASES = {}
+for _index, (_osis, _name, _number, _abbreviations) in enumerate(_BOOK_TABLE):
+    _book = Book(_osis, f"{_number} {_name}" if _number else _name, _index)
+    BOOKS.append(_book)
+    for _alias in [_name] + _abbreviations:
+        _ALIASES[(_number, fold(_alias))] = _book
+BOOKS_BY_OSIS = {book.osis: book for book in BOOKS}
+
+_NUMBERS = {word: number for number, words in _NUMBER_WORDS.items() for word in words}
+# Los prefijos con letras deben ir separados del nombre ("i juan", no "is")
+_NUMBER_RE = re.compile(
+    r'(?:(?P<digit>[123](?:era|er|ra|ro|da|do|a|o)?)|(?P<word>iii|ii|i|primera|primero|primer|segunda|segundo|tercera|tercero|tercer)(?=[\s.]))'
+    r'\.?\s*(?:de\s+)?'
+)
+_BOOK_RE = re.compile(
+    r'(?P<name>' + '|'.join(re.escape(alias) for alias in sorted({alias for _, alias in _ALIASES}, key=len, reverse=True)) + r')(?![a-z])\.?\s*'
+)
+_CHAPTER_RE = re.compile(r'(?P<chapter>\d+)(?:\s*[:.]\s*(?P<verses>\d+(?:\s*-\s*\d+)?(?:\s*,\s*\d+(?:\s*-\s*\d+)?)*))?\s*')
+_RANGE_RE = re.compile(r'(\d+)(?:\s*-\s*(\d+))?')
+_WORD_RE = re.compile(r'\S+')
+
+def find_book(text):
+    """Devuelve el libro que corresponde a un nombre o abreviatura, o None"""
+    book, rest = _match_book(fold(text))
+    return book if book and not rest else None
+
+def _match_book(text):
+    candidates = []
+    number = _NUMBER_RE.match(text)
+    if number:
+        word = number.group('digit') or number.group('word')
+        candidates.append((_NUMBERS[word], text[number.end():]))
+    candidates.append((None, text))
+    for value, rest in candidates:
+        match = _BOOK_RE.match(rest)
+        if match:
+            book = _ALIASES.get((value, match.group('name')))
+            if book:
+                return book, rest[match.end():]
+    return None, text
+
+def _parse_segment(segment, previous_book):
+    """Interpreta 'Libro cap[:vers[-vers][,vers]]' y devuelve (referencias, resto)"""
+    book, rest = _match_book(segment)
+    if book is None:
+        if previous_book is None:
+            raise InvalidReference(f"No reconozco el libro en '{segment}'.")
+        book = previous_book
+
+    match = _CHAPTER_RE.match(rest)
+    if not match:
+        raise InvalidReference(f"Falta el capítulo en '{segment}'.")
+    chapter = int(match.group('chapter'))
+    if not 1 <= chapter <= chapter_count(book.osis):
+        raise InvalidReference(f"{book.name} no tiene capítulo {chapter}.")
+    last_verse = verse_count(book.osis, chapter)
+
+    if match.group('verses') is None:
+        return [Reference(book, chapter, None, None)], rest[match.end():]
+
+    references = []
+    for start, end in _RANGE_RE.findall(match.group('verses')):
+        start = int(start)
+        end = int(end) if end else start
+        if start < 1 or end < start:
+            raise InvalidReference(f"Rango de versículos no válido en '{segment}'.")
+        if end > last_verse:
+            raise InvalidReference(f"{book.name} {chapter} solo tiene {last_verse} versículos.")
+        references.append(Reference(book, chapter, start, end))
+    return references, rest[match.end():]
+
+def parse_references(text):
+    """Interpreta una lista de referencias separadas por ';' (p. ej. 'Juan 3:16; Rom 8:28')"""
+    references = []
+    previous_book = None
+    for segment in fold(text).split(';'):
+        segment = segment.strip()
+        if not segment:
+            continue
+        parsed, rest = _parse_segment(segment, previous_book)
+        if rest:
+            raise InvalidReference(f"Referencia no válida: '{segment}'.")
+        references.extend(parsed)
+        previous_book = parsed[-1].book
+    if not references:
+        raise InvalidReference("No se indicó ninguna referencia.")
+    return references
+
+def parse_reference(text):
+    """Interpreta una única referencia (un versículo, un rango o un capítulo)"""
+    references = parse_references(text)
+    if len(references) != 1:
+        raise InvalidReference("Indica una sola referencia.")
+    return references[0]
+
+def parse_reference_prefix(text):
+    """Separa la referencia inicial del texto que la sigue (p. ej. en '!nota')"""
+    words = list(_WORD_RE.finditer(text))
+    # Probar desde el prefijo más largo posible (libro + número + capítulo:versículo)
+    for size in range(min(len(words), 5), 0, -1):
+        end = words[size - 1].end()
+        try:
+            reference = parse_reference(text[:end])
+        except InvalidReference:
+            continue
+        return reference, text[end:].strip()
+    raise InvalidReference(f"No reconozco la referencia en '{text}'.")
+
+def random_reference(books=None):
+    """
+    Elige un versículo al azar con probabilidad uniforme entre todos los
+    versículos de los libros indicados (por defecto, toda la Biblia)
+    """
+    books = books or BOOKS
+    cumulative = []
+    total = 0
+    for book in books:
+        total += sum(VERSES[book.osis])
+        cumulative.append(total)
+
+    position = random.randrange(total)
+    index = bisect.bisect_right(cumulative, position)
+    book = books[index]
+    if index:
+        position -= cumulative[index - 1]
+    for chapter, count in enumerate(VERSES[book.osis], start=1):
+        if position < count:
+            return Reference(book, chapter, position + 1, position + 1)
+        position -= count
+
+def reference_from_key(key):
+    """Reconstruye una referencia a partir de su clave canónica ('John.3.16-18')"""
+    parts = key.split('.')
+    book = BOOKS_BY_OSIS.get(parts[0])
+    if book is None or len(parts) not in (2, 3):
+        raise InvalidReference(f"Clave no válida: '{key}'.")
+    chapter = int(parts[1])
+    if len(parts) == 2:
+        return Reference(book, chapter, None, None)
+    start, _, end = parts[2].partition('-')
+    return Reference(book, chapter, int(start), int(end or start))
+
+def next_chapter(reference):
+    """Capítulo siguiente en orden de lectura, o None al final de Apocalipsis"""
+    if reference.chapter < chapter_count(reference.book.osis):
+        return Reference(reference.book, reference.chapter + 1, None, None)
+    if reference.book.index + 1 < len(BOOKS):
+        return Reference(BOOKS[reference.book.index + 1], 1, None, None)
+    return None
@@ -0,0 +1,195 @@
+import math
+import os
+import re
+import sqlite3
+import sys
+from collections import defaultdict
+from bible.passage_store import PassageStore
+from bible.references import BOOKS_BY_OSIS, Reference, fold
+
+DEFAULT_INDEX_PATH = os.getenv(
+    'SEARCH_INDEX_PATH',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'search_index.db')
+)
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+_QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+# Palabras demasiado frecuentes para aportar al ranking. Se indexan igualmente para poder
+# buscar frases formadas solo por ellas ("el que"), pero las consultas las ignoran si hay otras
+STOPWORDS = frozenset(
+    'a al como con de del el en es esta este la las le les lo los me mi no o os para por que se si '
+    'su sus te tu un una y ya'.split()
+)
+MAX_PREFIX_TERMS = 64
+
+def tokenize(text):
+    """Palabras sin acentos y en minúsculas"""
+    return _TOKEN_RE.findall(fold(text))
+
+def _encode(ids):
+    """Lista ordenada de ids -> diferencias codificadas como varint"""
+    data = bytearray()
+    previous = 0
+    for value in ids:
+        delta = value - previous
+        previous = value
+        while delta >= 0x80:
+            data.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        data.append(delta)
+    return bytes(data)
+
+def _decode(blob):
+    ids = []
+    value = shift = previous = 0
+    for byte in blob:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += value
+        ids.append(previous)
+        value = shift = 0
+    return ids
+
+def build_index(store, path=DEFAULT_INDEX_PATH):
+    """Construye el índice invertido a partir del almacén local de pasajes"""
+    rows = sorted(store.iter_verses(), key=lambda row: (BOOKS_BY_OSIS[row[0]].index, row[1], row[2]))
+    if not rows:
+        raise ValueError("El almacén de pasajes está vacío; importa el texto primero.")
+
+    postings = defaultdict(list)
+    verses = []
+    for verse_id, (book, chapter, verse, text) in enumerate(rows):
+        tokens = tokenize(text)
+        verses.append((verse_id, book, chapter, verse, len(tokens)))
+        for term in set(tokens):
+            postings[term].append(verse_id)
+
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute('CREATE TABLE verses (id INTEGER PRIMARY KEY, book TEXT, chapter INTEGER, verse INTEGER, length INTEGER)')
+        conn.execute('CREATE TABLE terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL, postings BLOB NOT NULL) WITHOUT ROWID')
+        with conn:
+            conn.executemany('INSERT INTO verses VALUES (?, ?, ?, ?, ?)', verses)
+            conn.executemany(
+                'INSERT INTO terms VALUES (?, ?, ?)',
+                ((term, len(ids), _encode(ids)) for term, ids in postings.items())
+            )
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    return len(verses), len(postings)
+
+class SearchIndex:
+    """Búsqueda por palabras, frases ("...") y prefijos (pala*) sin consultar la red"""
+    def __init__(self, path=DEFAULT_INDEX_PATH, store=None, k1=1.2, b=0.75):
+        self.path = path
+        self.store = store or PassageStore()
+        self.k1 = k1
+        self.b = b
+        self._conn = None
+        self._verses = None
+
+    @property
+    def available(self):
+        return os.path.exists(self.path) and self.store.available
+
+    def _load(self):
+        """Abre el índice en la primera consulta y carga la tabla de versículos"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._verses = self._conn.execute('SELECT book, chapter, verse, length FROM verses ORDER BY id').fetchall()
+            self._average_length = sum(row[3] for row in self._verses) / max(len(self._verses), 1)
+
+    def _postings(self, term):
+        row = self._conn.execute('SELECT postings FROM terms WHERE term = ?', (term,)).fetchone()
+        return set(_decode(row[0])) if row else set()
+
+    def _prefix_postings(self, prefix):
+        rows = self._conn.execute(
+            'SELECT postings FROM terms WHERE term >= ? AND term < ? ORDER BY df DESC LIMIT ?',
+            (prefix, prefix + '\uffff', MAX_PREFIX_TERMS)
+        ).fetchall()
+        ids = set()
+        for row in rows:
+            ids.update(_decode(row[0]))
+        return ids
+
+    def _idf(self, frequency):
+        total = len(self._verses)
+        return math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+
+    def search(self, query, limit=10):
+        """Devuelve hasta `limit` pares (Reference, texto) ordenados por relevancia"""
+        self._load()
+        clauses = []
+        required = None
+        phrases = []
+        for phrase, word in _QUERY_RE.findall(query):
+            if phrase:
+                tokens = tokenize(phrase)
+                # Si la frase solo tiene palabras vacías, esas mismas dan los candidatos
+                terms = [token for token in tokens if token not in STOPWORDS] or tokens
+                postings = [self._postings(term) for term in terms]
+                if tokens:
+                    phrases.append(' '.join(tokens))
+                for ids in postings:
+                    # Los términos de una frase son obligatorios
+                    required = set(ids) if required is None else required & ids
+                clauses.extend(postings)
+            elif word.endswith('*'):
+                prefix = ''.join(tokenize(word[:-1]))
+                if len(prefix) >= 2:
+                    clauses.append(self._prefix_postings(prefix))
+            else:
+                clauses.extend(self._postings(token) for token in tokenize(word) if token not in STOPWORDS)
+        if not clauses:
+            return []
+
+        # BM25 con frecuencia 1 por versículo: suma del idf de los términos que aparecen
+        scores = defaultdict(float)
+        for ids in clauses:
+            weight = self._idf(len(ids))
+            for verse_id in ids if required is None else ids & required:
+                scores[verse_id] += weight
+        ranked = sorted(
+            scores.items(),
+            key=lambda item: item[1] * self._length_norm(item[0]),
+            reverse=True
+        )
+
+        results = []
+        for verse_id, _ in ranked:
+            book, chapter, verse, _ = self._verses[verse_id]
+            rows = self.store.get_verses(book, chapter, verse, verse)
+            if not rows:
+                continue
+            text = rows[0][1]
+            if phrases:
+                # Las frases se comprueban sobre el texto real del versículo
+                folded = f" {' '.join(tokenize(text))} "
+                if not all(f" {phrase} " in folded for phrase in phrases):
+                    continue
+            results.append((Reference(BOOKS_BY_OSIS[book], chapter, verse, verse), text))
+            if len(results) >= limit:
+                break
+        return results
+
+    def _length_norm(self, verse_id):
+        length = self._verses[verse_id][3]
+        return (self.k1 + 1) / (1 + self.k1 * (1 - self.b + self.b * length / self._average_length))
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+if __name__ == "__main__":
+    destino = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_INDEX_PATH
+    total_verses, total_terms = build_index(PassageStore(), destino)
+    print(f"Índice creado en {destino}: {total_verses} versículos, {total_terms} términos")
@@ -1,36 +1,137 @@
+import asyncio
+import logging
 import os
+import time
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
 from database.db import Database
 from ai.openai_helper import OpenAIHelper
+from ai.reflection_pool import ReflectionPool
 from bible.bible_helper import BibleHelper
-from chatterbot import ChatBot
-from chatterbot.trainers import ListTrainer
-import random
+from bible.search_index import SearchIndex
+from bible.references import find_book, parse_reference, parse_references, parse_reference_prefix, random_reference
+from bot.chat_worker import ChatBusy, ChatWorker
+from bot.notes_view import NotesView
 
 load_dotenv()
 
+logger = logging.getLogger('bot')
+
+# Lista de libros populares de la Biblia
+LIBROS_REFLEXION = [
+    # Evangelios
+    "Mateo", "Marcos", "Lucas", "Juan",
+    # Cartas de Pablo
+    "Romanos", "1 Corintios", "2 Corintios", "Gálatas", 
+    "Efesios", "Filipenses", "Colosenses", "1 Tesalonicenses",
+    "2 Tesalonicenses", "1 Timoteo", "2 Timoteo", "Tito", "Filemón",
+    # Cartas Generales
+    "Hebreos", "Santiago", "1 Pedro", "2 Pedro", 
+    "1 Juan", "2 Juan", "3 Juan", "Judas",
+    # Libros de Sabiduría
+    "Salmos", "Proverbios", "Eclesiastés", "Cantares",
+    # Profetas
+    "Isaías", "Jeremías", "Lamentaciones", "Ezequiel", "Daniel",
+    "Oseas", "Joel", "Amós", "Abdías", "Jonás", "Miqueas",
+    "Nahum", "Habacuc", "Sofonías", "Hageo", "Zacarías", "Malaquías",
+    # Libros Históricos
+    "Josué", "Jueces", "Rut", "1 Samuel", "2 Samuel",
+    "1 Reyes", "2 Reyes", "1 Crónicas", "2 Crónicas",
+    "Esdras", "Nehemías", "Ester",
+    # Apocalipsis
+    "Apocalipsis"
+]
+
 class BiblotBot(commands.Bot):
     def __init__(self):
         intents = discord.Intents.default()
         intents.message_content = True
         super().__init__(command_prefix='!', intents=intents)
         
-        self.db = Database()
-        self.ai_helper = OpenAIHelper()
-        self.bible_helper = BibleHelper()
-        
+        # Los subsistemas se crean en segundo plano tras conectar o en su primer uso,
+        # para que el gateway de Discord conecte sin esperar a ninguno
+        self._subsystems = {}
+        self._startup_task = None
+        self._created_at = time.perf_counter()
+        self.startup_times = {}
+
+    async def subsystem(self, name):
+        """Devuelve el subsistema `name`, creándolo (una sola vez) si todavía no existe"""
+        task = self._subsystems.get(name)
+        # Si falló al crearse (p. ej. la base de datos no respondía), se vuelve a intentar
+        if task is None or (task.done() and (task.cancelled() or task.exception() is not None)):
+            task = asyncio.ensure_future(self._timed(name, getattr(self, f'_create_{name}')()))
+            self._subsystems[name] = task
+        return await asyncio.shield(task)
+
+    async def _timed(self, name, creation):
+        started = time.perf_counter()
+        try:
+            return await creation
+        finally:
+            self.startup_times[name] = time.perf_counter() - started
+
+    async def _create_db(self):
+        # Pool de conexiones a Postgres; las consultas se ejecutan fuera del event loop
+        db = Database()
+        try:
+            await db.open()
+        except BaseException:
+            # Si falla o se cancela (apagado), no dejar conexiones ni hilos abiertos
+            await db.close()
+            raise
+        return db
+
+    async def _create_ai_helper(self):
+        return OpenAIHelper()
+
+    async def _create_bible_helper(self):
+        bible_helper = BibleHelper()
+        # Precarga de pasajes en segundo plano y calentamiento de la caché tras el arranque
+        bible_helper.prefetcher.start()
+        try:
+            await bible_helper.prefetcher.warm_up()
+        except BaseException:
+            await bible_helper.close()
+            raise
+        return bible_helper
+
+    async def _create_search_index(self):
+        bible_helper = await self.subsystem('bible_helper')
+        return SearchIndex(store=bible_helper.store)
+
+    async def _create_reflection_pool(self):
+        bible_helper, ai_helper = await asyncio.gather(self.subsystem('bible_helper'), self.subsystem('ai_helper'))
+        reflection_pool = ReflectionPool(
+            bible_helper, ai_helper, books=[find_book(libro) for libro in LIBROS_REFLEXION]
+        )
+        # Reserva de reflexiones: se rellena en segundo plano
+        reflection_pool.start()
+        return reflection_pool
+
+    async def _create_chat_worker(self):
+        # Crear y entrenar ChatterBot toca disco: se hace en un hilo
+        self.chatbot = await asyncio.to_thread(self._create_chatbot)
+        # Las respuestas del ChatBot se calculan en un pool de hilos acotado
+        return ChatWorker(self.chatbot)
+
+    def _create_chatbot(self):
+        # ChatterBot tarda en importarse: solo se carga aquí, fuera del arranque
+        from chatterbot import ChatBot
+        from bot.training import train_if_changed
+
         # Inicializar ChatterBot con configuración mejorada
-        self.chatbot = ChatBot(
+        chatbot = ChatBot(
             'Biblot',
             storage_adapter='chatterbot.storage.SQLStorageAdapter',
             database_uri='sqlite:///database.sqlite3',
             logic_adapters=[
                 {
-                    'import_path': 'chatterbot.logic.BestMatch',
+                    # Índice TF-IDF de n-gramas en lugar del recorrido con Levenshtein de BestMatch
+                    'import_path': 'ai.ngram_match.NgramMatch',
                     'default_response': 'Lo siento, no entiendo completamente. ¿Podrías reformular tu pregunta?',
-                    'maximum_similarity_threshold': 0.90
+                    'minimum_similarity': 0.3
                 },
                 {
                     'import_path': 'chatterbot.logic.MathematicalEvaluation'
@@ -45,62 +146,70 @@ class BiblotBot(commands.Bot):
                 'chatterbot.preprocessors.unescape_html'
             ]
         )
-        
-        # Remover el entrenamiento estático y agregar un método más dinámico
-        self.train_dynamic_responses()
-        
-    def train_dynamic_responses(self):
-        """Método para entrenar el bot con respuestas más dinámicas"""
-        trainer = ListTrainer(self.chatbot)
-        
-        # Categorías de conversación
-        religious_conversations = [
-            ["¿Qué es la fe?", 
-             "La fe es la confianza y creencia en Dios y sus promesas, incluso cuando no podemos ver el resultado.",
-             "La fe es fundamental en nuestra relación con Dios y se manifiesta en nuestras acciones diarias."],
-            ["¿Cómo puedo orar?",
-             "La oración es una conversación personal con Dios. Puedes empezar simplemente hablando con Él desde tu corazón.",
-             "Jesús nos enseñó a orar en Mateo 6:9-13 con el Padre Nuestro como ejemplo."]
-        ]
-
-        bible_study_conversations = [
-            ["¿Cómo estudio la Biblia?",
-             "Puedes empezar leyendo un capítulo al día y reflexionando sobre su significado.",
-             "Te sugiero usar el método SOAP: Scripture (Escritura), Observation (Observación), Application (Aplicación), Prayer (Oración)"],
-            ["¿Por dónde empiezo a leer la Biblia?",
-             "Muchos recomiendan empezar por el Evangelio de Juan para conocer a Jesús.",
-             "También puedes empezar por el libro de Salmos para oraciones y alabanzas."]
-        ]
-
-        # Entrenar con cada categoría
-        for conversation_set in [religious_conversations, bible_study_conversations]:
-            for conversation in conversation_set:
-                trainer.train(conversation)
+        # Solo se reentrena cuando cambia el corpus (bot/training_corpus.json)
+        if train_if_changed(chatbot):
+            print("Corpus de conversación entrenado")
+        return chatbot
+
+    async def _start_subsystems(self):
+        """Crea todos los subsistemas a la vez en segundo plano e informa de cuánto tardó cada uno"""
+        names = ['db', 'ai_helper', 'bible_helper', 'search_index', 'reflection_pool', 'chat_worker']
+        results = await asyncio.gather(*(self.subsystem(name) for name in names), return_exceptions=True)
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                logger.error(f"No se pudo iniciar {name}: {str(result)}")
+        phases = ', '.join(f"{name} {seconds:.2f} s" for name, seconds in self.startup_times.items())
+        logger.info(f"Subsistemas listos en {time.perf_counter() - self._created_at:.2f} s ({phases})")
 
     async def process_chat_response(self, message_content):
-        """Procesa la respuesta del chat con múltiples intentos y manejo de errores"""
+        """Procesa la respuesta del chat fuera del event loop y con manejo de errores"""
         try:
-            # Primer intento: respuesta directa
-            response = self.chatbot.get_response(message_content)
-            confidence = response.confidence
-
-            # Si la confianza es baja, intentar con variaciones
-            if confidence < 0.5:
-                # Intentar con el mensaje simplificado
-                simplified = ' '.join(message_content.lower().split())
-                alt_response = self.chatbot.get_response(simplified)
-                
-                # Usar la respuesta con mayor confianza
-                if alt_response.confidence > confidence:
-                    response = alt_response
-
-            return str(response)
+            chat_worker = await self.subsystem('chat_worker')
+            return await chat_worker.respond(message_content)
+        except ChatBusy:
+            return "Estoy atendiendo muchas conversaciones en este momento. ¿Podrías intentarlo en unos segundos?"
         except Exception as e:
             print(f"Error en el procesamiento del chat: {str(e)}")
             return "Lo siento, tuve un problema procesando tu mensaje. ¿Podrías intentarlo de nuevo?"
 
+    async def send_streamed(self, ctx, chunks, max_length=1900, edit_interval=1.2):
+        """
+        Publica un mensaje de inmediato y lo va editando con el texto que llega.
+        Las ediciones se espacian `edit_interval` segundos para respetar los
+        límites de Discord; al llegar a `max_length` se continúa en otro mensaje.
+        """
+        message = await ctx.send("⏳ Generando...")
+        content = ''
+        shown = ''
+        last_edit = 0.0
+        async for delta in chunks:
+            content += delta
+            while len(content) > max_length:
+                # Cerrar el mensaje actual en el último espacio y seguir en uno nuevo
+                cut = content.rfind(' ', 0, max_length)
+                if cut <= 0:
+                    cut = max_length
+                await message.edit(content=content[:cut])
+                content = content[cut:].lstrip()
+                # Lo que sobra puede seguir siendo demasiado largo (respuestas de la caché llegan
+                # de una vez): en ese caso el mensaje nuevo empieza vacío y el bucle sigue cortando
+                shown = content if len(content) <= max_length else ''
+                message = await ctx.send(shown or "⏳")
+                last_edit = time.monotonic()
+            if content != shown and time.monotonic() - last_edit >= edit_interval:
+                await message.edit(content=content)
+                shown = content
+                last_edit = time.monotonic()
+        if content != shown or not content:
+            await message.edit(content=content or "No se recibió ninguna respuesta.")
+
+    async def setup_hook(self):
+        # No se espera a los subsistemas: el gateway conecta mientras se inician
+        self._startup_task = asyncio.create_task(self._start_subsystems())
+
     async def on_ready(self):
         print(f'Bot conectado como {self.user.name}')
+        logger.info(f"Gateway conectado en {time.perf_counter() - self._created_at:.2f} s")
         await self.change_presence(activity=discord.Game(name="!ayuda para ver comandos"))
         self.add_commands()
 
@@ -122,32 +231,47 @@ class BiblotBot(commands.Bot):
                 await ctx.send("No puedo enviarte mensajes privados. Por favor, habilita los mensajes directos en tus configuraciones de privacidad.")
 
         @self.command(name='versiculo')
-        async def get_verse(ctx, libro, versiculo):
-            """Obtiene un versículo específico de la Biblia"""
+        async def get_verse(ctx, *, referencia):
+            """Obtiene uno o varios versículos (separados por ';')"""
             try:
-                reference = f"{libro} {versiculo}"
-                verse_text = await self.bible_helper.get_verse(reference)
-                await ctx.send(f"**{reference}**\n{verse_text}")
+                # La referencia se valida antes de cualquier E/S
+                references = parse_references(referencia)
+                bible_helper = await self.subsystem('bible_helper')
+                if len(references) == 1:
+                    verse_text = await bible_helper.get_verse(references[0])
+                    await ctx.send(f"**{references[0]}**\n{verse_text}")
+                    return
+
+                # Varias referencias: una sola consulta agrupada
+                passages = await bible_helper.get_passages(references)
+                for reference, verses in zip(references, passages):
+                    if verses is None:
+                        await ctx.send(f"**{reference}**\nNo se encontró el pasaje solicitado.")
+                    else:
+                        await ctx.send(f"**{reference}**\n{' '.join(text for _, text in verses)}")
             except Exception as e:
                 await ctx.send(f"Error al obtener el versículo: {str(e)}")
 
         @self.command(name='explicar')
-        async def explain_verse(ctx, libro, versiculo):
+        async def explain_verse(ctx, *, referencia):
             """Explica un versículo específico"""
             try:
-                reference = f"{libro} {versiculo}"
-                verse_text = await self.bible_helper.get_verse(reference)
-                explanation = self.ai_helper.get_verse_explanation(verse_text)
+                reference = parse_reference(referencia)
+                ai_helper = await self.subsystem('ai_helper')
+                bible_helper = await self.subsystem('bible_helper')
+                verse_text = await bible_helper.get_verse(reference)
+                explanation = await ai_helper.get_verse_explanation(verse_text)
                 await ctx.send(f"**{reference}**\n{verse_text}\n\n**Explicación:**\n{explanation}")
             except Exception as e:
                 await ctx.send(f"Error al explicar el versículo: {str(e)}")
 
         @self.command(name='capitulo')
-        async def get_chapter(ctx, libro, capitulo):
+        async def get_chapter(ctx, *, referencia):
             """Obtiene un capítulo completo de la Biblia"""
             try:
-                reference = f"{libro} {capitulo}"
-                chapter_text = await self.bible_helper.get_chapter(reference)
+                reference = parse_reference(referencia)
+                bible_helper = await self.subsystem('bible_helper')
+                chapter_text = await bible_helper.get_chapter(reference)
                 
                 # Dividir el texto en partes si es muy largo
                 max_length = 1900  # Límite de Discord es 2000
@@ -160,20 +284,16 @@ class BiblotBot(commands.Bot):
                 await ctx.send(f"Error al obtener el capítulo: {str(e)}")
 
         @self.command(name='explicarcapitulo')
-        async def explain_chapter(ctx, libro, capitulo):
+        async def explain_chapter(ctx, *, referencia):
             """Explica un capítulo completo de la Biblia"""
             try:
-                reference = f"{libro} {capitulo}"
-                chapter_text = await self.bible_helper.get_chapter(reference)
-                explanation = self.ai_helper.get_chapter_explanation(chapter_text)
-                
-                # Dividir la explicación en partes si es muy larga
-                max_length = 1900
-                parts = [explanation[i:i+max_length] for i in range(0, len(explanation), max_length)]
-                
+                reference = parse_reference(referencia)
+                ai_helper = await self.subsystem('ai_helper')
+                bible_helper = await self.subsystem('bible_helper')
+                chapter_text = await bible_helper.get_chapter(reference)
                 await ctx.send(f"**Explicación de {reference}**")
-                for part in parts:
-                    await ctx.send(part)
+                # La explicación se va mostrando a medida que el modelo la genera
+                await self.send_streamed(ctx, ai_helper.stream_chapter_explanation(chapter_text))
             except Exception as e:
                 await ctx.send(f"Error al explicar el capítulo: {str(e)}")
 
@@ -181,63 +301,102 @@ class BiblotBot(commands.Bot):
         async def daily_reflection(ctx, *, args=None):
             """Genera una reflexión sobre un versículo. Si no se especifica libro ni versículo, genera una reflexión aleatoria."""
             try:
+                ai_helper = await self.subsystem('ai_helper')
+                bible_helper = await self.subsystem('bible_helper')
+                reflection_pool = await self.subsystem('reflection_pool')
                 if args is None:
-                    # Lista de libros populares de la Biblia
-                    libros = [
-                        # Evangelios
-                        "Mateo", "Marcos", "Lucas", "Juan",
-                        # Cartas de Pablo
-                        "Romanos", "1 Corintios", "2 Corintios", "Gálatas", 
-                        "Efesios", "Filipenses", "Colosenses", "1 Tesalonicenses",
-                        "2 Tesalonicenses", "1 Timoteo", "2 Timoteo", "Tito", "Filemón",
-                        # Cartas Generales
-                        "Hebreos", "Santiago", "1 Pedro", "2 Pedro", 
-                        "1 Juan", "2 Juan", "3 Juan", "Judas",
-                        # Libros de Sabiduría
-                        "Salmos", "Proverbios", "Eclesiastés", "Cantares",
-                        # Profetas
-                        "Isaías", "Jeremías", "Lamentaciones", "Ezequiel", "Daniel",
-                        "Oseas", "Joel", "Amós", "Abdías", "Jonás", "Miqueas",
-                        "Nahum", "Habacuc", "Sofonías", "Hageo", "Zacarías", "Malaquías",
-                        # Libros Históricos
-                        "Josué", "Jueces", "Rut", "1 Samuel", "2 Samuel",
-                        "1 Reyes", "2 Reyes", "1 Crónicas", "2 Crónicas",
-                        "Esdras", "Nehemías", "Ester",
-                        # Apocalipsis
-                        "Apocalipsis"
-                    ]
-                    libro = random.choice(libros)
-                    # Generar un capítulo aleatorio (1-21 para la mayoría de los libros)
-                    capitulo = random.randint(1, 21)
-                    # Generar un versículo aleatorio (1-30 para la mayoría de los capítulos)
-                    versiculo = f"{capitulo}:{random.randint(1, 30)}"
+                    # Primero la reserva generada de antemano; si está vacía, en el momento
+                    pooled = reflection_pool.pop()
+                    if pooled is not None:
+                        reference, verse_text, reflection = pooled
+                        await ctx.send(f"**Reflexión sobre {reference}**\n{verse_text}\n\n{reflection}")
+                        return
+                    # Versículo válido elegido de forma uniforme con la tabla de versificación
+                    reference = random_reference(reflection_pool.books)
                 else:
-                    partes = args.split()
-                    if len(partes) < 2:
+                    if len(args.split()) < 2:
                         await ctx.send("Por favor, proporciona el libro y el versículo (ejemplo: !reflexion Juan 3:16)")
                         return
-                    libro = partes[0]
-                    versiculo = partes[1]
+                    reference = parse_reference(args)
                 
-                reference = f"{libro} {versiculo}"
-                verse_text = await self.bible_helper.get_verse(reference)
-                reflection = self.ai_helper.generate_daily_reflection(verse_text)
+                verse_text = await bible_helper.get_verse(reference)
+                reflection = await ai_helper.generate_daily_reflection(verse_text)
                 await ctx.send(f"**Reflexión sobre {reference}**\n{verse_text}\n\n{reflection}")
             except Exception as e:
                 await ctx.send(f"Error al generar la reflexión: {str(e)}")
 
+        @self.command(name='buscar')
+        async def search(ctx, *, palabras):
+            """Busca versículos por palabras, frases entre comillas o prefijos (amor*)"""
+            try:
+                search_index = await self.subsystem('search_index')
+                if not search_index.available:
+                    await ctx.send("La búsqueda no está disponible en este momento.")
+                    return
+
+                results = search_index.search(palabras, limit=5)
+                if not results:
+                    await ctx.send(f"No encontré versículos para: {palabras}")
+                    return
+
+                embed = discord.Embed(
+                    title=f"🔎 Resultados para: {palabras}"[:256],
+                    color=discord.Color.blue()
+                )
+                for reference, text in results:
+                    embed.add_field(name=str(reference), value=text[:1024], inline=False)
+                await ctx.send(embed=embed)
+            except Exception as e:
+                await ctx.send(f"Error al buscar: {str(e)}")
+
+        @self.command(name='estado')
+        @commands.is_owner()
+        async def status(ctx):
+            """Estado de los servicios externos (solo para el dueño del bot)"""
+            bible_helper, ai_helper = await asyncio.gather(self.subsystem('bible_helper'), self.subsystem('ai_helper'))
+            embed = discord.Embed(title="Estado de los servicios", color=discord.Color.blue())
+            for name, stats in (('biblegateway', bible_helper.stats()), ('OpenAI', ai_helper.stats())):
+                upstream = stats['upstream']
+                embed.add_field(
+                    name=name,
+                    value=(f"Circuito: {upstream['state']} (abierto {upstream['trips']} veces, "
+                           f"{upstream['rejected']} llamadas rechazadas)\n"
+                           f"Llamadas: {upstream['calls']}, reintentos: {upstream['retried']}, "
+                           f"duplicadas: {upstream['hedged']}, tiempos agotados: {upstream['timeouts']}\n"
+                           f"Respuestas caducadas servidas: {stats['cache']['stale_hits']}"),
+                    inline=False
+                )
+            db_stats = (await self.subsystem('db')).stats()
+            embed.add_field(
+                name="Base de datos",
+                value=(f"Conexiones: {db_stats['size']} abiertas, {db_stats['idle']} libres, "
+                       f"{db_stats['waiting']} esperando\n"
+                       f"Operaciones: {db_stats['operations']}, idas y vueltas: {db_stats['round_trips']} "
+                       f"({db_stats['round_trips_per_operation']:.2f} por operación)\n"
+                       f"Reintentos por conexión perdida: {db_stats['retries']}, comprobaciones: {db_stats['pings']}\n"
+                       f"Usuarios conocidos: {db_stats['known_users']} ({db_stats['known_user_hits']} consultas evitadas)"),
+                inline=False
+            )
+            embed.add_field(
+                name="Arranque",
+                value='\n'.join(f"{name}: {seconds:.2f} s" for name, seconds in self.startup_times.items()) or "En curso",
+                inline=False
+            )
+            await ctx.send(embed=embed)
+
         @self.command(name='ayuda')
         async def help_command(ctx):
             """Muestra la lista de comandos disponibles"""
             ayuda_texto = """
 **Comandos disponibles:**
-- `!versiculo <libro> <capitulo:versiculo>` - Muestra un versículo específico
+- `!versiculo <libro> <capitulo:versiculo>` - Muestra un versículo (o varios separados por `;`)
 - `!explicar <libro> <capitulo:versiculo>` - Explica un versículo específico
 - `!capitulo <libro> <capitulo>` - Muestra un capítulo completo
 - `!explicarcapitulo <libro> <capitulo>` - Explica un capítulo completo
 - `!reflexion <libro> <capitulo:versiculo>` - Genera una reflexión sobre un versículo
+- `!buscar <palabras>` - Busca versículos por palabras, "frases exactas" o prefijos (amor*)
 - `!nota <libro> <capitulo:versiculo> <nota>` - Añade una nota personal a un versículo
-- `!misnotas` - Muestra todas tus notas guardadas
+- `!misnotas` - Muestra tus notas guardadas, por páginas
 - `!privado` - Envía instrucciones por mensaje privado
 - `!ayuda` - Muestra este mensaje de ayuda
 
@@ -247,36 +406,33 @@ class BiblotBot(commands.Bot):
 - `!capitulo Salmos 23`
 - `!explicarcapitulo Juan 3`
 - `!reflexion Proverbios 3:5`
+- `!buscar "vida eterna"`
 - `!nota Juan 3:16 Esta es mi nota personal`
 - `!misnotas`
 """
             await ctx.send(ayuda_texto)
 
         @self.command(name='nota')
-        async def add_note(ctx, libro, versiculo, *, nota):
+        async def add_note(ctx, *, args):
             """Añade una nota personal a un versículo"""
             try:
+                # Validar la referencia antes de abrir la base de datos o ir a la red
+                reference, nota = parse_reference_prefix(args)
+
                 # Verificar el formato de capítulo:versículo
-                if ':' not in versiculo:
+                if reference.start is None or reference.start != reference.end or not nota:
                     await ctx.send("Por favor, usa el formato correcto: libro capítulo:versículo nota")
                     return
-                    
-                chapter, verse = versiculo.split(':')
-                
-                try:
-                    chapter = int(chapter)
-                    verse = int(verse)
-                except ValueError:
-                    await ctx.send("El capítulo y versículo deben ser números")
-                    return
+
+                db = await self.subsystem('db')
+                bible_helper = await self.subsystem('bible_helper')
                 
                 # Obtener el versículo primero
-                reference = f"{libro} {chapter}:{verse}"
-                verse_text = await self.bible_helper.get_verse(reference)
+                verse_text = await bible_helper.get_verse(reference)
                 
-                # Guardar la nota en la base de datos
-                user_id = self.db.get_or_create_user(str(ctx.author.id), ctx.author.name)
-                self.db.add_note(user_id, libro, chapter, verse, verse_text, nota)
+                # Guardar la nota en la base de datos con el nombre canónico del libro
+                user_id = await db.get_or_create_user(str(ctx.author.id), ctx.author.name)
+                await db.add_note(user_id, reference.book.name, reference.chapter, reference.start, verse_text, nota)
                 
                 # Crear el embed con el versículo y la nota
                 embed = discord.Embed(
@@ -293,49 +449,19 @@ class BiblotBot(commands.Bot):
 
         @self.command(name='misnotas')
         async def get_notes(ctx):
-            """Muestra todas las notas guardadas del usuario"""
+            """Muestra las notas guardadas del usuario, por páginas"""
             try:
-                user_id = self.db.get_or_create_user(str(ctx.author.id), ctx.author.name)
-                notes = self.db.get_user_notes(user_id)
-                
-                if not notes:
-                    embed = discord.Embed(
-                        title="📝 Tus Notas",
-                        description="No tienes notas guardadas todavía.\n\n"
-                                  "Usa el comando `!nota` para guardar una nota.",
-                        color=discord.Color.blue()
-                    )
-                    await ctx.send(embed=embed)
+                db = await self.subsystem('db')
+                user_id = await db.get_or_create_user(str(ctx.author.id), ctx.author.name)
+
+                # Solo se consulta la primera página; los botones piden las demás
+                view = NotesView(db, user_id, ctx.author.id)
+                await view.load()
+                if not view.notes:
+                    await ctx.send(embed=view.embed())
                     return
-                
-                # Crear el embed con las notas
-                embed = discord.Embed(
-                    title=f"📝 Tus Notas ({len(notes)})",
-                    color=discord.Color.blue()
-                )
-                
-                for i, note_data in enumerate(notes):
-                    try:
-                        note = str(note_data[0]) if note_data[0] else "Sin contenido"
-                        created_at = str(note_data[1]) if len(note_data) > 1 else "Sin fecha"
-                        book = str(note_data[2]) if len(note_data) > 2 else "Sin libro"
-                        chapter = str(note_data[3]) if len(note_data) > 3 else "?"
-                        verse = str(note_data[4]) if len(note_data) > 4 else "?"
-                        
-                        embed.add_field(
-                            name=f"{i+1}. {book} {chapter}:{verse}",
-                            value=f"{note}\n*Guardado el {created_at}*",
-                            inline=False
-                        )
-                    except Exception as e:
-                        embed.add_field(
-                            name=f"Error en nota {i+1}",
-                            value=str(e),
-                            inline=False
-                        )
-                
-                await ctx.send(embed=embed)
-                
+                view.message = await ctx.send(embed=view.embed(), view=view)
+
             except Exception as e:
                 await ctx.send(f"Error al obtener las notas: {str(e)}")
 
@@ -382,6 +508,32 @@ class BiblotBot(commands.Bot):
             except Exception as e:
                 print(f"Error en el manejo del mensaje: {str(e)}")
 
+    async def close(self):
+        # Cancelar lo que aún se está creando para que no termine después del apagado
+        if self._startup_task is not None:
+            self._startup_task.cancel()
+        pending = [task for task in self._subsystems.values() if not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        # Cerrar las conexiones HTTP compartidas antes de apagar el bot (solo lo que se llegó a crear)
+        created = {
+            name: task.result() for name, task in self._subsystems.items()
+            if task.done() and not task.cancelled() and task.exception() is None
+        }
+        if 'reflection_pool' in created:
+            await created['reflection_pool'].close()
+        if 'bible_helper' in created:
+            await created['bible_helper'].close()
+        if 'ai_helper' in created:
+            await created['ai_helper'].close()
+        if 'db' in created:
+            await created['db'].close()
+        if 'chat_worker' in created:
+            created['chat_worker'].close()
+        await super().close()
+
 # Crear la instancia del bot
 bot = BiblotBot()
 
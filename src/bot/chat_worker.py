@@ -0,0 +1,94 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from ai.ngram_match import NgramMatch
+from bible.passage_cache import LRUCache
+from utils.singleflight import SingleFlight
+
+class ChatBusy(Exception):
+    """La cola de mensajes de chat está llena"""
+
+def normalize_message(message):
+    """Minúsculas y espacios colapsados: la forma con la que se memorizan las respuestas"""
+    return ' '.join(message.lower().split())
+
+class ChatWorker:
+    """
+    Ejecuta ChatterBot en un pool de hilos propio para no bloquear el event
+    loop. Admite como mucho `max_pending` mensajes entre cola y ejecución, y
+    recuerda las respuestas recientes por mensaje normalizado. Solo se
+    recuerdan las de NgramMatch (incluida la predeterminada): la hora o el
+    resultado de una operación no deben repetirse durante una hora.
+    """
+    def __init__(self, chatbot, workers=None, max_pending=None, memo=None):
+        self.chatbot = chatbot
+        self.workers = workers or int(os.getenv('CHAT_WORKERS', '1'))
+        self.max_pending = max_pending or int(os.getenv('CHAT_MAX_PENDING', '16'))
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='chat')
+        self.memo = memo if memo is not None else LRUCache(max_entries=256, max_bytes=512 * 1024, ttl=3600)
+        self.memo_adapters = [adapter for adapter in chatbot.logic_adapters if isinstance(adapter, NgramMatch)]
+        self.singleflight = SingleFlight()
+        self.pending = 0
+        self.memo_hits = 0
+        self.inferences = 0
+        self.fallbacks = 0
+        self.rejected = 0
+
+    async def respond(self, message):
+        """Respuesta del ChatBot al mensaje; lanza ChatBusy si la cola está llena"""
+        key = normalize_message(message)
+        cached = self.memo.get(key)
+        if cached is not None:
+            self.memo_hits += 1
+            return cached
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise ChatBusy()
+
+        self.pending += 1
+        try:
+            # Mensajes iguales que llegan a la vez comparten una sola inferencia
+            return await self.singleflight.do(key, self._run, message, key)
+        finally:
+            self.pending -= 1
+
+    async def _run(self, message, key):
+        loop = asyncio.get_running_loop()
+        response, memoizable = await loop.run_in_executor(self.executor, self._infer, message, key)
+        if memoizable:
+            self.memo.set(key, response)
+        return response
+
+    def _from_memo_adapter(self, response):
+        """Si la respuesta elegida por ChatterBot es la que dio NgramMatch en este hilo"""
+        return any(adapter.last_response() == response.text for adapter in self.memo_adapters)
+
+    def _infer(self, message, simplified):
+        """Se ejecuta en un hilo del pool; devuelve la respuesta y si se puede memorizar"""
+        self.inferences += 1
+        response = self.chatbot.get_response(message)
+        memoizable = self._from_memo_adapter(response)
+
+        # Si la confianza es baja, intentar con el mensaje simplificado, salvo que
+        # solo cambien mayúsculas o espacios: NgramMatch ya compara el texto plegado
+        if response.confidence < 0.5 and normalize_message(simplified) != normalize_message(message):
+            self.fallbacks += 1
+            alt_response = self.chatbot.get_response(simplified)
+            # Usar la respuesta con mayor confianza
+            if alt_response.confidence > response.confidence:
+                response = alt_response
+                memoizable = self._from_memo_adapter(response)
+        return str(response), memoizable
+
+    def stats(self):
+        return {
+            'pending': self.pending,
+            'inferences': self.inferences,
+            'fallbacks': self.fallbacks,
+            'memo_hits': self.memo_hits,
+            'coalesced': self.singleflight.saved,
+            'rejected': self.rejected,
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=False)
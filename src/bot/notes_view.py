@@ -0,0 +1,134 @@
+import os
+import discord
+
+NOTES_PAGE_SIZE = int(os.getenv('NOTES_PAGE_SIZE', '5'))
+# Límites de Discord: 6000 caracteres por embed en total y 1024 por valor de campo
+EMBED_MAX_CHARS = 6000
+FIELD_MAX_CHARS = 1024
+# Reserva para el título del embed y el nombre de cada campo ("12. Apocalipsis 22:21")
+TITLE_RESERVE = 64
+FIELD_NAME_RESERVE = 48
+
+def _shorten(text, limit):
+    """Recorta el texto a `limit` caracteres en el último espacio"""
+    if len(text) <= limit:
+        return text
+    return text[:limit - 1].rsplit(' ', 1)[0] + '…'
+
+class NotesView(discord.ui.View):
+    """
+    Embed paginado de `!misnotas`. Cada botón pide a la base de datos solo la
+    página siguiente o la anterior a partir del cursor de la página visible,
+    así la memoria y la latencia no dependen de cuántas notas tenga el usuario.
+    """
+    def __init__(self, db, user_id, author_id, page_size=NOTES_PAGE_SIZE, timeout=180):
+        super().__init__(timeout=timeout)
+        self.db = db
+        self.user_id = user_id
+        self.author_id = author_id
+        # Discord admite como mucho 25 campos por embed
+        self.page_size = min(page_size, 25)
+        self.notes = []
+        self.page = 1
+        self.has_newer = False
+        self.has_older = False
+        # Página anterior a una página vacía de notas más antiguas, para poder volver
+        self._previous = None
+        self.message = None
+
+    async def load(self, direction=None):
+        """Carga la primera página, o la de notas más antiguas ('older') o más recientes ('newer')"""
+        if direction == 'older':
+            last = self.notes[-1]
+            notes, has_more = await self.db.get_user_notes(
+                self.user_id, self.page_size, before=(last['created_at'], last['id'])
+            )
+            # Si las notas más antiguas se borraron entretanto la página sale vacía y
+            # sin cursor propio: se guarda la actual para poder volver a ella
+            self._previous = (self.notes, self.has_newer) if not notes else None
+            self.page += 1
+            self.has_newer, self.has_older = True, has_more
+        elif direction == 'newer' and self._previous is not None:
+            notes, self.has_newer = self._previous
+            self._previous = None
+            self.page -= 1
+            self.has_older = False
+        elif direction == 'newer':
+            first = self.notes[0]
+            notes, has_more = await self.db.get_user_notes(
+                self.user_id, self.page_size, after=(first['created_at'], first['id'])
+            )
+            if not notes:
+                # Se borraron las más recientes: la primera página es la más nueva que queda
+                return await self.load()
+            self.page -= 1
+            self.has_newer, self.has_older = has_more, True
+        else:
+            notes, has_more = await self.db.get_user_notes(self.user_id, self.page_size)
+            self.page = 1
+            self.has_newer, self.has_older = False, has_more
+        self.notes = notes
+        self.newer.disabled = not self.has_newer
+        self.older.disabled = not self.has_older or not notes
+
+    def embed(self):
+        if not self.notes and self.page == 1:
+            return discord.Embed(
+                title="📝 Tus Notas",
+                description="No tienes notas guardadas todavía.\n\n"
+                          "Usa el comando `!nota` para guardar una nota.",
+                color=discord.Color.blue()
+            )
+
+        embed = discord.Embed(
+            title=f"📝 Tus Notas (página {self.page})",
+            color=discord.Color.blue()
+        )
+        if not self.notes:
+            embed.description = "No quedan notas más antiguas."
+        # Repartir el total del embed entre las notas de la página
+        budget = min(
+            FIELD_MAX_CHARS,
+            (EMBED_MAX_CHARS - TITLE_RESERVE) // self.page_size - FIELD_NAME_RESERVE
+        )
+        first = (self.page - 1) * self.page_size
+        for i, note_data in enumerate(self.notes, start=first + 1):
+            note = str(note_data['note']) if note_data['note'] else "Sin contenido"
+            footer = f"\n*Guardado el {note_data['created_at']}*"
+            quote = f"> {_shorten(note_data['verse_text'] or '', min(150, budget // 4))}\n"
+            embed.add_field(
+                name=f"{i}. {note_data['book']} {note_data['chapter']}:{note_data['verse']}"[:FIELD_NAME_RESERVE],
+                value=quote + _shorten(note, budget - len(quote) - len(footer)) + footer,
+                inline=False
+            )
+        return embed
+
+    async def interaction_check(self, interaction):
+        # Solo quien pidió sus notas puede pasar las páginas
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("Estas notas no son tuyas. Usa `!misnotas`.", ephemeral=True)
+            return False
+        return True
+
+    @discord.ui.button(label="◀ Más recientes", style=discord.ButtonStyle.secondary)
+    async def newer(self, interaction, button):
+        # Responder antes de consultar la base de datos: Discord da 3 s para hacerlo
+        await interaction.response.defer()
+        await self.load('newer')
+        await interaction.edit_original_response(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="Más antiguas ▶", style=discord.ButtonStyle.secondary)
+    async def older(self, interaction, button):
+        await interaction.response.defer()
+        await self.load('older')
+        await interaction.edit_original_response(embed=self.embed(), view=self)
+
+    async def on_timeout(self):
+        # Desactivar los botones cuando la vista deja de escuchar
+        self.newer.disabled = True
+        self.older.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass
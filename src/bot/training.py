@@ -0,0 +1,92 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from chatterbot.conversation import Statement as ConversationStatement
+from sqlalchemy import text
+
+logger = logging.getLogger('training')
+
+DEFAULT_CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'training_corpus.json')
+TRAINING_CONVERSATION = 'training'
+
+def load_corpus(path=DEFAULT_CORPUS_PATH):
+    """Devuelve (versión, conversaciones, hash del contenido) del corpus de entrenamiento"""
+    with open(path, encoding='utf-8') as corpus_file:
+        corpus = json.load(corpus_file)
+    conversations = [
+        conversation
+        for category in corpus['categories'].values()
+        for conversation in category
+    ]
+    data = json.dumps(conversations, ensure_ascii=False, sort_keys=True)
+    return corpus['version'], conversations, hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def _trained_hash(session):
+    session.execute(text(
+        'CREATE TABLE IF NOT EXISTS training_version ('
+        'id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL, '
+        'content_hash TEXT NOT NULL, trained_at REAL NOT NULL)'
+    ))
+    row = session.execute(text('SELECT content_hash FROM training_version WHERE id = 1')).fetchone()
+    return row[0] if row else None
+
+def _preprocess(chatbot, value):
+    """Aplica los mismos preprocesadores que ListTrainer"""
+    statement = ConversationStatement(text=value)
+    for preprocessor in chatbot.preprocessors:
+        statement = preprocessor(statement)
+    return statement.text
+
+def train_if_changed(chatbot, path=DEFAULT_CORPUS_PATH):
+    """
+    Entrena el ChatBot con el corpus solo si su contenido cambió desde el
+    último entrenamiento. Las frases anteriores del corpus se reemplazan y
+    todo se guarda en una sola transacción. Devuelve True si entrenó.
+    """
+    version, conversations, content_hash = load_corpus(path)
+    storage = chatbot.storage
+    session = storage.Session()
+    try:
+        if _trained_hash(session) == content_hash:
+            session.commit()
+            return False
+
+        started = time.perf_counter()
+        Statement = storage.get_model('statement')
+        tagger = storage.tagger
+        # Reemplazar el corpus anterior (y los duplicados de entrenamientos repetidos)
+        session.query(Statement).filter(Statement.conversation == TRAINING_CONVERSATION).delete(
+            synchronize_session=False
+        )
+        statements = []
+        for conversation in conversations:
+            previous = None
+            for value in conversation:
+                value = _preprocess(chatbot, value)
+                search_text = tagger.get_bigram_pair_string(value)
+                statements.append(Statement(
+                    text=value,
+                    search_text=search_text,
+                    conversation=TRAINING_CONVERSATION,
+                    in_response_to=previous[0] if previous else None,
+                    search_in_response_to=previous[1] if previous else '',
+                ))
+                previous = (value, search_text)
+        session.add_all(statements)
+        session.execute(
+            text('INSERT OR REPLACE INTO training_version (id, version, content_hash, trained_at) '
+                 'VALUES (1, :version, :content_hash, :trained_at)'),
+            {'version': version, 'content_hash': content_hash, 'trained_at': time.time()}
+        )
+        session.commit()
+        logger.info(
+            f"Corpus v{version} entrenado: {len(statements)} frases en {time.perf_counter() - started:.2f} s"
+        )
+        return True
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('database')
+
+class PoolTimeout(Exception):
+    """No se consiguió una conexión libre dentro del tiempo de espera"""
+
+class _ConnectionLost(Exception):
+    """Envuelve el error de una sentencia cuando además se perdió la conexión"""
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+class ConnectionPool:
+    """
+    Pool de conexiones para usar desde el event loop. Las conexiones se
+    reparten con un semáforo de `max_size` plazas y las sentencias se
+    ejecutan en un pool de hilos propio, así nunca bloquean el bot.
+
+    `connect` crea una conexión nueva (DB-API); `discard_on` son las
+    excepciones que pueden indicar que la conexión quedó inservible e
+    `is_lost(conexión)` confirma que de verdad se perdió (y no que falló la
+    consulta, p. ej. por cancelación o interbloqueo). Las sentencias se
+    ejecutan sin comprobar antes la conexión: si se perdió, se reintenta una
+    vez con una conexión nueva, salvo con `retry=False` (escrituras que no se
+    pueden repetir porque no se sabe si llegaron a confirmarse). La comprobación
+    (`ping`) la hace en segundo plano un worker sobre las conexiones que
+    llevan más de `ping_interval` segundos sin usarse.
+    """
+    def __init__(self, connect, min_size=1, max_size=5, acquire_timeout=5.0, discard_on=(),
+                 is_lost=None, ping=None, ping_interval=60.0):
+        self.connect = connect
+        self.is_lost = is_lost
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.discard_on = tuple(discard_on)
+        self.ping = ping
+        self.ping_interval = ping_interval
+        self._pinger = None
+        self.executor = ThreadPoolExecutor(max_workers=max_size, thread_name_prefix='db')
+        self._idle = deque()
+        self._semaphore = None
+        self.size = 0
+        self.acquired = 0
+        self.waiting = 0
+        self.timeouts = 0
+        self.discarded = 0
+        self.retries = 0
+        self.pings = 0
+        self.wait_total = 0.0
+
+    async def _run_sync(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def open(self):
+        """Abre las `min_size` conexiones iniciales"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_size)
+        await self._fill()
+        if self.ping is not None and self._pinger is None:
+            self._pinger = asyncio.create_task(self._ping_idle())
+
+    async def _fill(self):
+        """Completa las conexiones libres hasta `min_size`"""
+        missing = self.min_size - self.size
+        if missing > 0:
+            connections = await asyncio.gather(*(self._run_sync(self.connect) for _ in range(missing)))
+            self._idle.extend((connection, time.monotonic()) for connection in connections)
+            self.size += len(connections)
+
+    async def acquire(self, timeout=None, fresh=False):
+        """Reserva una conexión; con `fresh` se abre una nueva en vez de reutilizar una libre"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_size)
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout or self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise PoolTimeout(
+                f"Sin conexiones libres tras {timeout or self.acquire_timeout} s ({self.size} abiertas)"
+            )
+        finally:
+            self.waiting -= 1
+        self.wait_total += time.perf_counter() - started
+        self.acquired += 1
+
+        try:
+            if self._idle and not fresh:
+                return self._idle.pop()[0]
+            connection = await self._run_sync(self.connect)
+            self.size += 1
+            # Una conexión nueva con el pool lleno sustituye a la libre más antigua,
+            # para no pasar de `max_size` conexiones abiertas
+            if self.size > self.max_size and self._idle:
+                self._close(self._idle.popleft()[0])
+            return connection
+        except BaseException:
+            self._semaphore.release()
+            raise
+
+    def release(self, connection, discard=False):
+        """Devuelve la conexión al pool (o la cierra si quedó inservible)"""
+        if discard:
+            self._close(connection)
+        else:
+            self._idle.append((connection, time.monotonic()))
+        self._semaphore.release()
+
+    def _close(self, connection):
+        self.size -= 1
+        self.discarded += 1
+        try:
+            connection.close()
+        except Exception as e:
+            logger.warning(f"Error al cerrar una conexión descartada: {str(e)}")
+
+    def _lost(self, connection, error):
+        if not isinstance(error, self.discard_on):
+            return False
+        return self.is_lost is None or self.is_lost(connection)
+
+    async def run(self, func, *args, timeout=None, retry=True):
+        """Ejecuta `func(conexión, *args)` en un hilo con una conexión del pool"""
+        try:
+            return await self._run_once(func, args, timeout)
+        except _ConnectionLost as lost:
+            if not retry:
+                raise lost.error
+            # La conexión estaba rota: reintentar una sola vez con una nueva
+            logger.warning(f"Conexión perdida, reintentando con una nueva: {str(lost.error)}")
+            self.retries += 1
+        try:
+            return await self._run_once(func, args, timeout, fresh=True)
+        except _ConnectionLost as lost:
+            raise lost.error
+
+    async def _run_once(self, func, args, timeout, fresh=False):
+        connection = await self.acquire(timeout, fresh)
+        future = asyncio.get_running_loop().run_in_executor(self.executor, func, connection, *args)
+
+        def finished(done):
+            # La conexión vuelve al pool cuando el hilo termina, aunque se cancele quien esperaba
+            error = None if done.cancelled() else done.exception()
+            self.release(connection, discard=self._lost(connection, error))
+
+        future.add_done_callback(finished)
+        try:
+            return await asyncio.shield(future)
+        except self.discard_on as e:
+            if self._lost(connection, e):
+                raise _ConnectionLost(e) from None
+            raise
+
+    async def _ping_idle(self):
+        """Comprueba en segundo plano las conexiones libres que llevan tiempo sin usarse"""
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            stale = sum(1 for _, released_at in self._idle if time.monotonic() - released_at >= self.ping_interval)
+            for _ in range(stale):
+                # Sin plazas libres el pool está en uso y no hace falta comprobar nada
+                if self._semaphore.locked() or not self._idle:
+                    break
+                await self._semaphore.acquire()
+                connection, released_at = self._idle.popleft()
+                if time.monotonic() - released_at < self.ping_interval:
+                    self.release(connection)
+                    break
+                self.pings += 1
+                try:
+                    await self._run_sync(self.ping, connection)
+                except Exception as e:
+                    logger.warning(f"Conexión inactiva descartada: {str(e)}")
+                    self.release(connection, discard=True)
+                else:
+                    self.release(connection)
+            # Reponer las conexiones descartadas para que la siguiente consulta no tenga que conectar
+            try:
+                await self._fill()
+            except Exception as e:
+                logger.warning(f"No se pudieron reponer las conexiones del pool: {str(e)}")
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'idle': len(self._idle),
+            'waiting': self.waiting,
+            'acquired': self.acquired,
+            'timeouts': self.timeouts,
+            'discarded': self.discarded,
+            'retries': self.retries,
+            'pings': self.pings,
+            'wait_avg': self.wait_total / self.acquired if self.acquired else 0.0,
+        }
+
+    async def close(self):
+        if self._pinger is not None:
+            self._pinger.cancel()
+            self._pinger = None
+        while self._idle:
+            connection, _ = self._idle.pop()
+            self.size -= 1
+            try:
+                connection.close()
+            except Exception:
+                pass
+        self.executor.shutdown(wait=False)
@@ -0,0 +1 @@
+# Este archivo hace que el directorio src/utils sea un paquete Python 
\ No newline at end of file
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import random
+import time
+
+logger = logging.getLogger('resilience')
+
+class CircuitOpen(Exception):
+    """El servicio externo está marcado como caído; la llamada no se intenta"""
+    def __init__(self, name):
+        super().__init__(f"El servicio {name} no está disponible en este momento")
+        self.name = name
+
+def is_transient(error):
+    """Los errores 4xx (salvo 408 y 429) son del cliente: ni se reintentan ni abren el circuito"""
+    status = getattr(error, 'status', None) or getattr(error, 'status_code', None)
+    if isinstance(status, int) and 400 <= status < 500:
+        return status in (408, 429)
+    return True
+
+class CircuitBreaker:
+    """
+    Tras `failure_threshold` fallos seguidos deja de llamar al servicio durante
+    `reset_timeout` segundos; después deja pasar una llamada de prueba.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._probing = False
+
+    def allow(self):
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = self.HALF_OPEN
+            self._probing = False
+        if self.state == self.HALF_OPEN:
+            # Solo una llamada de prueba a la vez
+            if self._probing:
+                self.rejected += 1
+                return False
+            self._probing = True
+        return True
+
+    def release(self):
+        """La llamada de prueba se canceló sin resultado"""
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self._probing = False
+        if self.state != self.CLOSED:
+            logger.info(f"Circuito {self.name} cerrado de nuevo")
+        self.state = self.CLOSED
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+                logger.warning(f"Circuito {self.name} abierto tras {self.failures} fallos")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'trips': self.trips,
+            'rejected': self.rejected,
+        }
+
+class Resilience:
+    """
+    Política común para las llamadas a servicios externos: tiempo límite por
+    intento y total, reintentos con espera exponencial aleatoria, petición
+    duplicada opcional (`hedge_after`) para las colas de latencia y circuito.
+    """
+    def __init__(self, name, timeout=10, deadline=None, retries=2, backoff=0.2, max_backoff=2.0,
+                 hedge_after=None, breaker=None):
+        self.name = name
+        self.timeout = timeout
+        self.deadline = deadline or timeout * (retries + 1)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        self.breaker = breaker if breaker is not None else CircuitBreaker(name)
+        self.calls = 0
+        self.retried = 0
+        self.hedged = 0
+        self.timeouts = 0
+
+    async def call(self, func, *args, timeout=None, **kwargs):
+        """Ejecuta `await func(*args, **kwargs)` aplicando la política"""
+        self.calls += 1
+        timeout = timeout or self.timeout
+        give_up_at = time.monotonic() + max(self.deadline, timeout)
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpen(self.name)
+            remaining = give_up_at - time.monotonic()
+            try:
+                result = await asyncio.wait_for(self._attempt(func, args, kwargs), min(timeout, remaining))
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeouts += 1
+                if not is_transient(e):
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+                attempt += 1
+                if attempt > self.retries or time.monotonic() + delay >= give_up_at:
+                    raise
+                self.retried += 1
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def _attempt(self, func, args, kwargs):
+        if self.hedge_after is None:
+            return await func(*args, **kwargs)
+
+        tasks = {asyncio.ensure_future(func(*args, **kwargs))}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+            if not done:
+                # La primera petición tarda demasiado: lanzar otra y quedarse con la que acabe antes
+                self.hedged += 1
+                tasks.add(asyncio.ensure_future(func(*args, **kwargs)))
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self):
+        return dict(
+            self.breaker.stats(),
+            calls=self.calls,
+            retried=self.retried,
+            hedged=self.hedged,
+            timeouts=self.timeouts,
+        )
@@ -0,0 +1,32 @@
+import asyncio
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una sola ejecución"""
+    def __init__(self):
+        self._inflight = {}
+        self.calls = 0
+        self.saved = 0
+
+    async def do(self, key, func, *args, **kwargs):
+        """Ejecuta func una sola vez por clave; los demás esperan el mismo resultado"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            self.calls += 1
+        else:
+            self.saved += 1
+        # shield: si un usuario cancela, la llamada compartida sigue para los demás
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Marcar la excepción como recuperada aunque ya no quede nadie esperando
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        """Llamadas reales al servicio externo y llamadas ahorradas"""
+        return {'calls': self.calls, 'saved': self.saved, 'in_flight': len(self._inflight)}